@@ -1,6 +1,7 @@
+import importlib
+
 from db_orm import School, Router, Vendor, Switch, Model, District, KMSNet, UsersNet, RTNet
-from db_orm import MGTSNet, WLC, Prime, AP, Project, SchNet, Credentials, db_session
-from old_db_orm import OldSchool, OldRouter, OldSwitch, OldWLC, OldDidtrict, OldPrime, old_db_session
+from db_orm import MGTSNet, WLC, Prime, AP, Project, SchNet, Credentials
 
 __all__ = [
     "OldSchool",
@@ -28,3 +29,21 @@ __all__ = [
     "Credentials",
     "db_session",
 ]
+
+""" Loaded on first access, the legacy database is not needed by most scripts """
+_lazy = {
+    "OldSchool": "old_db_orm",
+    "OldRouter": "old_db_orm",
+    "OldSwitch": "old_db_orm",
+    "OldWLC": "old_db_orm",
+    "OldDidtrict": "old_db_orm",
+    "OldPrime": "old_db_orm",
+    "old_db_session": "old_db_orm",
+    "db_session": "db_orm",
+}
+
+
+def __getattr__(name):
+    if name in _lazy:
+        return getattr(importlib.import_module(_lazy[name]), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
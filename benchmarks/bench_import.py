@@ -0,0 +1,64 @@
+"""
+Startup time of the package: lazy import versus the old eager path
+(both engines, both declarative bases and both sessions built at import).
+Every sample runs in a fresh interpreter.
+
+    python benchmarks/bench_import.py --runs 20
+"""
+import os
+import sys
+import json
+import argparse
+import subprocess
+
+from time import perf_counter
+from statistics import median
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+IMPORT_PACKAGE = f"""
+import sys
+import importlib.util
+sys.path.insert(0, {ROOT!r})
+spec = importlib.util.spec_from_file_location(
+    "tool_db_sch", {os.path.join(ROOT, "__init__.py")!r}, submodule_search_locations=[{ROOT!r}]
+)
+package = importlib.util.module_from_spec(spec)
+sys.modules["tool_db_sch"] = package
+spec.loader.exec_module(package)
+"""
+
+CASES = {
+    "lazy": IMPORT_PACKAGE,
+    "eager": IMPORT_PACKAGE + """
+package.db_session
+package.old_db_session
+package.OldSchool
+""",
+}
+
+
+def sample(code):
+    env = dict(os.environ)
+    env.setdefault("NEW_SCHOOL_DATABASE", "postgresql://localhost/bench")
+    env.setdefault("OLD_SCHOOL_DATABASE", "postgresql://localhost/bench_old")
+    start = perf_counter()
+    subprocess.run([sys.executable, "-c", code], env=env, check=True)
+    return perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=10)
+    args = parser.parse_args()
+    results = {}
+    for name, code in CASES.items():
+        samples = [sample(code) for _ in range(args.runs)]
+        results[name] = {"median_s": median(samples), "min_s": min(samples)}
+    results["gain_s"] = results["eager"]["median_s"] - results["lazy"]["median_s"]
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+"""
+Benchmarks of the db_orm helpers on synthetic inventories of several sizes.
+Needs a scratch PostgreSQL database, which is dropped and refilled for every size.
+
+    python benchmarks/bench_orm.py --url postgresql://localhost/sch_bench --sizes 500 2000 5000 --output bench.json
+
+Results are saved as JSON, compare two runs with --compare old.json.
+"""
+import os
+import sys
+import json
+import random
+import argparse
+import platform
+import subprocess
+
+from datetime import datetime
+from statistics import median
+from time import perf_counter
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import db_orm  # noqa: E402
+from db_orm import School, Switch, Vendor, create, exist, exist_or_create, update  # noqa: E402
+from db_inventory import iter_connection_params  # noqa: E402
+from generate import reset_schema, generate  # noqa: E402
+
+
+def timed(function, operations, repeat=3):
+    """
+    :param function: runs `operations` operations
+    :return: dict with median seconds and operations per second
+    """
+    samples = []
+    for _ in range(repeat):
+        start = perf_counter()
+        function()
+        samples.append(perf_counter() - start)
+    seconds = median(samples)
+    return {"operations": operations, "seconds": seconds, "ops_per_s": operations / seconds if seconds else None}
+
+
+def run_size(schools, operations, seed=1):
+    reset_schema(db_orm.get_engine())
+    with db_orm.session_scope() as session:
+        start = perf_counter()
+        rows = generate(session, schools=schools, seed=seed)
+        generate_seconds = perf_counter() - start
+
+    rng = random.Random(seed)
+    switch_names = [f"sw-{rng.randrange(schools)}-{rng.randrange(10)}" for _ in range(operations)]
+    school_names = [f"school-{rng.randrange(schools)}" for _ in range(operations)]
+    results = {"rows": rows, "generate_seconds": generate_seconds}
+    session_factory = db_orm.get_session_factory()
+
+    def bench_create():
+        with db_orm.session_scope(commit=False) as session:
+            for i in range(operations):
+                create(Vendor, session, name=f"bench-vendor-{i}")
+            session.flush()
+            session.rollback()
+
+    def bench_exist():
+        with db_orm.session_scope(commit=False) as session:
+            for name in switch_names:
+                exist(Switch, session, name=name)
+
+    def bench_exist_or_create():
+        with db_orm.session_scope(commit=False) as session:
+            for i in range(operations):
+                exist_or_create(Vendor, session, name=f"bench-vendor-{i % 50}")
+            session.rollback()
+
+    def bench_update():
+        with db_orm.session_scope(commit=False) as session:
+            for name in switch_names:
+                update(exist(Switch, session, name=name), session, os_version="bench")
+            session.flush()
+            session.rollback()
+
+    def bench_traversal():
+        with db_orm.session_scope(commit=False) as session:
+            for name in school_names[:operations // 10 or 1]:
+                school = exist(School, session, name=name)
+                for relation in ("district", "wlc", "prime", "project", "router", "switches", "ap",
+                                 "kms_net", "users_net", "rt_net", "mgts_net", "sch_net"):
+                    getattr(school, relation)
+
+    def bench_params_objects():
+        db_orm.credentials_cache.clear()
+        session = session_factory()
+        try:
+            for switch in session.query(Switch).limit(operations):
+                switch.netmiko_params()
+        finally:
+            session.close()
+
+    def bench_params_inventory():
+        session = session_factory()
+        try:
+            for count, _ in enumerate(iter_connection_params(Switch, session=session), 1):
+                if count >= operations:
+                    break
+        finally:
+            session.close()
+
+    results["create"] = timed(bench_create, operations)
+    results["exist"] = timed(bench_exist, operations)
+    results["exist_or_create"] = timed(bench_exist_or_create, operations)
+    results["update"] = timed(bench_update, operations)
+    results["relationship_traversal"] = timed(bench_traversal, operations // 10 or 1)
+    results["params_objects"] = timed(bench_params_objects, operations)
+    results["params_inventory"] = timed(bench_params_inventory, operations)
+    return results
+
+
+def compare(old, new):
+    for size, results in new["sizes"].items():
+        for name, result in results.items():
+            before = old["sizes"].get(size, {}).get(name)
+            if isinstance(result, dict) and "seconds" in result and before:
+                change = (result["seconds"] - before["seconds"]) / before["seconds"] * 100
+                print(f"{size:>8} {name:<24} {before['seconds']:10.4f}s -> {result['seconds']:10.4f}s {change:+7.1f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--url", default=os.environ.get("NEW_SCHOOL_BENCH_DATABASE"))
+    parser.add_argument("--sizes", type=int, nargs="+", default=[500, 2000, 5000], help="number of schools")
+    parser.add_argument("--operations", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--compare", help="previous results JSON")
+    args = parser.parse_args()
+    if not args.url:
+        parser.error("--url or NEW_SCHOOL_BENCH_DATABASE is required, the database is dropped and refilled")
+
+    db_orm.configure(url=args.url)
+    revision = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                              capture_output=True, text=True).stdout.strip()
+    output = {
+        "created": datetime.now().isoformat(),
+        "revision": revision,
+        "python": platform.python_version(),
+        "operations": args.operations,
+        "seed": args.seed,
+        "sizes": {str(size): run_size(size, args.operations, args.seed) for size in args.sizes},
+    }
+    with open(args.output, "w") as file:
+        json.dump(output, file, indent=2)
+    print(json.dumps(output["sizes"], indent=2))
+    if args.compare:
+        with open(args.compare) as file:
+            compare(json.load(file), output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""
+Memory and time of reading a table as full ORM objects versus project() records.
+Runs against an existing database, for example one filled by generate.py.
+
+    python benchmarks/bench_projection.py --url postgresql://localhost/sch_bench --table ap
+"""
+import os
+import sys
+import json
+import argparse
+import tracemalloc
+
+from time import perf_counter
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import db_orm  # noqa: E402
+from db_projection import READ_COLUMNS, project_all  # noqa: E402
+
+
+def measure(function):
+    """
+    :return: (rows, seconds, peak traced memory in MiB)
+    """
+    tracemalloc.start()
+    start = perf_counter()
+    rows = function()
+    seconds = perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1] / 2 ** 20
+    tracemalloc.stop()
+    return len(rows), seconds, peak
+
+
+def main():
+    tables = {entity.__tablename__: entity for entity in READ_COLUMNS}
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--url", default=os.environ.get("NEW_SCHOOL_BENCH_DATABASE"))
+    parser.add_argument("--table", choices=sorted(tables), default="switch")
+    args = parser.parse_args()
+    if args.url:
+        db_orm.configure(url=args.url)
+    entity = tables[args.table]
+    results = {}
+    for name, function in (
+        ("orm", lambda session: session.query(entity).all()),
+        ("projection", lambda session: project_all(entity, session=session)),
+    ):
+        with db_orm.session_scope(commit=False) as session:
+            rows, seconds, peak = measure(lambda: function(session))
+        results[name] = {"rows": rows, "seconds": seconds, "peak_mib": peak}
+    results["speedup"] = results["orm"]["seconds"] / results["projection"]["seconds"]
+    results["memory_ratio"] = results["orm"]["peak_mib"] / results["projection"]["peak_mib"]
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
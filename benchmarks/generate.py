@@ -0,0 +1,156 @@
+"""
+Synthetic inventory for the benchmarks: districts, projects, WLCs, Primes,
+vendors, models, credentials, and per school a router, switches, APs
+and the kms/users/rt/mgts/sch networks. Deterministic for a given seed.
+
+    python benchmarks/generate.py --url postgresql://localhost/sch_bench --schools 5000
+"""
+import os
+import re
+import sys
+import random
+import argparse
+
+from ipaddress import ip_network, ip_address
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import db_orm  # noqa: E402
+from db_orm import School, Router, Vendor, Switch, Model, District, KMSNet, UsersNet, RTNet  # noqa: E402
+from db_orm import MGTSNet, WLC, Prime, AP, Project, SchNet, Credentials, bulk_exist_or_create  # noqa: E402
+from db_migrate import upgrade  # noqa: E402
+
+
+KMS_BASE = int(ip_address("10.0.0.0"))  # /24 per school
+USERS_BASE = int(ip_address("10.64.0.0"))  # /24 per school
+RT_BASE = int(ip_address("10.128.0.0"))  # /29 per school
+MGTS_BASE = int(ip_address("10.160.0.0"))  # /29 per school
+SCH_BASE = int(ip_address("10.192.0.0"))  # 2 x /30 per school
+ROUTER_BASE = int(ip_address("10.224.0.0"))  # one address per school
+
+
+def reset_schema(engine):
+    """
+    Drops everything and creates db_schema.sql plus the migrations (db_migrate.upgrade()),
+    without the ownership statements, which need the production roles
+    """
+    schema = open(os.path.join(ROOT, "db_schema.sql")).read()
+    schema = re.sub(r"(?im)^\s*alter (function|database) .* owner to .*;$", "", schema)
+    with engine.begin() as connection:
+        connection.exec_driver_sql("DROP SCHEMA public CASCADE; CREATE SCHEMA public;")
+        connection.exec_driver_sql(schema)
+    upgrade(engine)
+
+
+def net(base, index, size, prefixlen):
+    return str(ip_network(f"{ip_address(base + index * size)}/{prefixlen}"))
+
+
+def generate(session, schools=5000, switches_per_school=10, aps_per_school=40, seed=1):
+    """
+    Fills an empty schema
+    :param session: SQLAlchemy sesion to database 'sqlalchemy.orm.session.Session'
+    :param schools: number of schools, devices and networks scale with it
+    :return: dict table -> rows created
+    """
+    rng = random.Random(seed)
+    credentials = [
+        Credentials(username=f"user{i}", password=f"secret{i}", enable_pass=f"enable{i}",
+                    netmiko_device="cisco_ios", scrapli_driver="cisco_iosxe", scrapli_transport="system")
+        for i in range(3)
+    ]
+    session.add_all(credentials)
+    session.flush()
+    vendor_ids = bulk_exist_or_create(Vendor, [dict(name="Cisco"), dict(name="Eltex")], session, return_ids=True)
+    model_ids = bulk_exist_or_create(Model, [
+        dict(name=f"model-{i}", vendor_id=vendor_ids[i % 2], credentials_id=credentials[i % 3].id)
+        for i in range(6)
+    ], session, return_ids=True)
+    district_ids = bulk_exist_or_create(District, [
+        dict(name=f"district-{i}", name_en=f"district-en-{i}", full_name=f"District {i}", fqdn=f"d{i}.example")
+        for i in range(12)
+    ], session, return_ids=True)
+    project_ids = bulk_exist_or_create(Project, [dict(name=f"project-{2015 + i}") for i in range(10)],
+                                       session, return_ids=True)
+    wlc_ids = bulk_exist_or_create(WLC, [
+        dict(name=f"wlc-{i}", ip=f"10.250.0.{i + 1}", mgmt_ip=f"10.250.1.{i + 1}", option_43=f"f1{i:04x}")
+        for i in range(20)
+    ], session, return_ids=True)
+    prime_ids = bulk_exist_or_create(Prime, [dict(name=f"prime-{i}", ip=f"10.250.2.{i + 1}") for i in range(4)],
+                                     session, return_ids=True)
+
+    school_ids = bulk_exist_or_create(School, [
+        dict(
+            name=f"school-{i}",
+            short_name=f"sch{i}",
+            full_name=f"School number {i}",
+            address=f"Street {rng.randint(1, 500)}, {i}",
+            district_id=rng.choice(district_ids),
+            wlc_id=rng.choice(wlc_ids),
+            prime_id=rng.choice(prime_ids),
+            project_id=rng.choice(project_ids),
+            active=True,
+        )
+        for i in range(schools)
+    ], session, return_ids=True)
+
+    counts = {"school": len(school_ids)}
+    tables = {
+        Router: lambda i, school_id: [dict(
+            name=f"rt-{i}", sn=f"RT{i:08d}", ip=str(ip_address(ROUTER_BASE + i)),
+            school_id=school_id, model_id=model_ids[0], os_version="16.9",
+        )],
+        Switch: lambda i, school_id: [dict(
+            name=f"sw-{i}-{k}", sn=f"SW{i:06d}{k:03d}", ip=str(ip_address(KMS_BASE + i * 256 + 10 + k)),
+            mac=f"02:00:{i >> 16 & 255:02x}:{i >> 8 & 255:02x}:{i & 255:02x}:{k:02x}",
+            school_id=school_id, model_id=rng.choice(model_ids[1:3]), os_version="15.2",
+        ) for k in range(switches_per_school)],
+        AP: lambda i, school_id: [dict(
+            name=f"ap-{i}-{k}", sn=f"AP{i:06d}{k:03d}", ip=str(ip_address(USERS_BASE + i * 256 + 10 + k)),
+            mac=f"04:00:{i >> 16 & 255:02x}:{i >> 8 & 255:02x}:{i & 255:02x}:{k:02x}",
+            school_id=school_id, model_id=rng.choice(model_ids[3:]),
+        ) for k in range(aps_per_school)],
+        KMSNet: lambda i, school_id: [dict(
+            school_id=school_id, network=net(KMS_BASE, i, 256, 24), vlan30=net(KMS_BASE, i * 4, 64, 26),
+            vlan60=net(KMS_BASE, i * 4 + 1, 64, 26), vlan70=net(KMS_BASE, i * 4 + 2, 64, 26),
+        )],
+        UsersNet: lambda i, school_id: [dict(
+            school_id=school_id, network=net(USERS_BASE, i, 256, 24), vlan40=net(USERS_BASE, i * 2, 128, 25),
+            vlan50=net(USERS_BASE, i * 2 + 1, 128, 25),
+        )],
+        RTNet: lambda i, school_id: [dict(school_id=school_id, network=net(RT_BASE, i, 8, 29))],
+        MGTSNet: lambda i, school_id: [dict(school_id=school_id, network=net(MGTS_BASE, i, 8, 29))],
+        SchNet: lambda i, school_id: [
+            dict(school_id=school_id, network=net(SCH_BASE, i * 2 + k, 4, 30), description="uplink", kms=k == 0)
+            for k in range(2)
+        ],
+    }
+    for entity, rows in tables.items():
+        created = 0
+        for start in range(0, len(school_ids), 500):
+            batch = []
+            for i in range(start, min(start + 500, len(school_ids))):
+                batch.extend(rows(i, school_ids[i]))
+            created += len(bulk_exist_or_create(entity, batch, session, return_ids=True))
+        counts[entity.__tablename__] = created
+    session.commit()
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--url", default=os.environ.get("NEW_SCHOOL_BENCH_DATABASE"))
+    parser.add_argument("--schools", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    if not args.url:
+        parser.error("--url or NEW_SCHOOL_BENCH_DATABASE is required, the database is dropped and refilled")
+    db_orm.configure(url=args.url)
+    reset_schema(db_orm.get_engine())
+    with db_orm.session_scope() as session:
+        print(generate(session, schools=args.schools, seed=args.seed))
+
+
+if __name__ == "__main__":
+    main()
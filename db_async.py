@@ -0,0 +1,138 @@
+import os
+import asyncio
+import logging
+
+from sqlalchemy import select
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+
+import db_orm
+
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+
+"""
+asyncio versions of the db_orm helpers, same models, AsyncSession over asyncpg.
+An AsyncSession must not be shared between concurrent tasks, so every helper
+takes the session explicitly; run_bounded() gives each job its own session
+and keeps at most `limit` queries in flight, by default as many as the pool has connections:
+
+    async def lookup(session, name):
+        return await exist(Switch, session, name=name)
+
+    switches = await run_bounded([partial(lookup, name=name) for name in names])
+
+URL: NEW_SCHOOL_ASYNC_DATABASE, or NEW_SCHOOL_DATABASE with the asyncpg driver.
+"""
+async_db_url = os.environ.get("NEW_SCHOOL_ASYNC_DATABASE")
+_async_engine = None
+_async_session_factory = None
+
+
+def get_async_engine():
+    """
+    :return: async engine, created on first call with the pool settings of db_orm
+    """
+    global _async_engine
+    if _async_engine is None:
+        url = async_db_url or make_url(db_orm.db_url).set(drivername="postgresql+asyncpg")
+        _async_engine = create_async_engine(url, **db_orm.db_engine_options)
+    return _async_engine
+
+
+def get_async_session_factory():
+    """
+    :return: 'sqlalchemy.orm.sessionmaker' of AsyncSession
+    """
+    global _async_session_factory
+    if _async_session_factory is None:
+        _async_session_factory = sessionmaker(get_async_engine(), class_=AsyncSession, expire_on_commit=False)
+    return _async_session_factory
+
+
+async def create(entity, session, commit=False, **kwargs):
+    """
+    Creates a new object of the specified type, with the specified parameters
+    :param entity: SQLAlchemy ORM object
+    :param session: 'sqlalchemy.ext.asyncio.AsyncSession'
+    :param commit: Write to database if True, else need commit() outside.
+    :return: Newly created object
+    """
+    logger.debug("Trying create new object %s, with parametrs %s", entity, kwargs)
+    try:
+        new_entity = entity(**kwargs)
+        session.add(new_entity)
+        if commit:
+            await session.commit()
+        return new_entity
+    except SQLAlchemyError as error:
+        logger.error(error)
+
+
+async def exist(entity, session, **kwargs):
+    """
+    Searches for already existing objects with the given parameters
+    :param entity: SQLAlchemy ORM object
+    :param session: 'sqlalchemy.ext.asyncio.AsyncSession'
+    :return: existing object or None
+    """
+    result = await session.execute(select(entity).filter_by(**kwargs).limit(1))
+    exist_entity = result.scalars().first()
+    logger.debug("Check for exist %s(%s): %s", entity, kwargs, exist_entity is not None)
+    return exist_entity
+
+
+async def exist_or_create(entity, session, commit=False, **kwargs):
+    """
+    :param entity: SQLAlchemy ORM object
+    :param session: 'sqlalchemy.ext.asyncio.AsyncSession'
+    :param commit: Write to database if True, else need commit() outside.
+    :return: Newly or existing object
+    """
+    exist_entity = await exist(entity, session, **kwargs)
+    if exist_entity:
+        return exist_entity
+    return await create(entity, session, commit, **kwargs)
+
+
+async def update(entity, session, commit=False, **kwargs):
+    """
+    Updates the attributes of an existing object
+    :param entity: SQLAlchemy ORM object
+    :param session: 'sqlalchemy.ext.asyncio.AsyncSession'
+    :param commit: Write to database if True, else need commit() outside.
+    :return: Updated object
+    """
+    for attr, value in kwargs.items():
+        try:
+            setattr(entity, attr, value)
+        except AttributeError as error:
+            logger.error("Error update attr=%r, value=%r, error=%r", attr, value, error)
+    if commit:
+        await session.commit()
+    return entity
+
+
+async def run_bounded(jobs, limit=None):
+    """
+    Runs jobs concurrently, each with its own AsyncSession, at most `limit` at a time.
+    A larger `limit` than pool_size + max_overflow of the engine only makes jobs wait for a connection.
+    :param jobs: iterable of async callables taking a session, job(session)
+    :param limit: maximum number of jobs in flight, pool_size + max_overflow of db_orm.db_engine_options if None
+    :return: results in the order of jobs
+    """
+    if limit is None:
+        limit = db_orm.db_engine_options["pool_size"] + db_orm.db_engine_options["max_overflow"]
+    semaphore = asyncio.Semaphore(limit)
+    session_factory = get_async_session_factory()
+
+    async def run(job):
+        async with semaphore:
+            async with session_factory() as session:
+                return await job(session)
+
+    return await asyncio.gather(*(run(job) for job in jobs))
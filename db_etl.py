@@ -0,0 +1,500 @@
+import os
+import re
+import json
+import logging
+import argparse
+
+from datetime import datetime, timedelta
+from functools import partial
+
+from sqlalchemy import select, delete, cast, String, tuple_, MetaData, Table, Column, Integer
+from sqlalchemy.dialects.postgresql import insert
+
+from db_orm import School, Router, Vendor, Switch, Model, District, KMSNet, UsersNet, RTNet
+from db_orm import MGTSNet, WLC, Prime, Project, SchNet, get_session, bulk_exist_or_create, bulk_update, isnet, isip
+from old_db_orm import OldSchool, OldRouter, OldSwitch, OldWLC, OldDidtrict, OldPrime, get_old_engine
+
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+
+"""
+ETL from the old schema (old_db_orm) into the new one (db_orm).
+Every step streams one old table through a server-side cursor in key order,
+writes each batch with bulk_exist_or_create() and commits, then stores the last
+key of the batch in the checkpoint file, so an interrupted run resumes after the
+last committed batch and only one batch is held in memory at a time.
+Steps are idempotent, a batch replayed after a crash is a no-op.
+A failing batch is rolled back and stops the run, the checkpoint stays before it.
+Old school ids are recorded in legacy_school_map (db_migrate.py upgrade first).
+
+sync() is the incremental mode for the regular refresh: schools, routers and switches
+are read in updated_at order from the high-water mark of the previous run and
+written with changes applied (bulk_update() on top of the inserts), the small
+district, WLC and Prime tables are re-read every time. Devices are matched by serial
+number and schools by their old id (legacy_school_map), so a changed ip or name
+updates the row in place. deletions() compares the keys of both databases only
+and reports the rows missing in the old one.
+"""
+PREFIX_RE = re.compile(r"\d{1,3}(?:\.\d{1,3}){3}(?:/\d{1,2})?")
+VLAN_PREFIX_RE = re.compile(r"(\d{1,3}(?:\.\d{1,3}){3}(?:/\d{1,2})?)\s*\(?\s*(?:vlan\s*(\d+))?", re.IGNORECASE)
+
+""" migrations/0004_legacy_school_map.sql """
+legacy_school_map = Table(
+    "legacy_school_map",
+    MetaData(),
+    Column("old_id", Integer, primary_key=True),
+    Column("school_id", Integer, nullable=False),
+)
+
+
+class Checkpoint:
+    """
+    Last migrated key per step, stored in a JSON file
+    """
+    def __init__(self, path):
+        self.path = path
+        self.keys = {}
+        if path and os.path.exists(path):
+            with open(path) as file:
+                self.keys = json.load(file)
+
+    def get(self, step):
+        return self.keys.get(step)
+
+    def set(self, step, key):
+        self.keys[step] = key
+        if self.path:
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w") as file:
+                json.dump(self.keys, file)
+            os.replace(tmp_path, self.path)
+
+
+def parse_prefixes(text: str) -> list:
+    """
+    Extracts network prefixes from the free-text network columns of the old schema
+    :param text: for example "10.1.1.0/24, 10.1.2.0/24"
+    :return: list of normalized prefixes, in order of appearance, without duplicates
+    """
+    prefixes = []
+    for candidate in PREFIX_RE.findall(text or ""):
+        net = isnet(candidate)
+        if net and net not in prefixes:
+            prefixes.append(net)
+    return prefixes
+
+
+def parse_vlan_prefixes(text: str, vlans) -> dict:
+    """
+    Maps the prefixes of a free-text network column on the network and VLAN columns
+    :param text: for example "10.1.0.0/22, 10.1.2.0/26 (vlan 60), 10.1.1.0/26 vlan30"
+    :param vlans: VLAN numbers of the table, for example (30, 60, 70)
+    :return: dict column -> prefix, {"network": "10.1.0.0/22", "vlan60": "10.1.2.0/26", "vlan30": "10.1.1.0/26"};
+             an annotated prefix goes to its VLAN, unannotated ones fill `network`
+             and then the VLANs left in order, prefixes of unknown VLANs are skipped
+    """
+    columns, unannotated = {}, []
+    for candidate, vlan in VLAN_PREFIX_RE.findall(text or ""):
+        net = isnet(candidate)
+        if not net or net in columns.values() or net in unannotated:
+            continue
+        if not vlan:
+            unannotated.append(net)
+        elif int(vlan) in vlans and f"vlan{int(vlan)}" not in columns:
+            columns[f"vlan{int(vlan)}"] = net
+        else:
+            logger.warning(f"Prefix {net} of vlan {vlan} in {text!r} has no column, skipped")
+    free = [column for column in ["network"] + [f"vlan{vlan}" for vlan in vlans] if column not in columns]
+    columns.update(zip(free, unannotated))
+    return columns
+
+
+def stream(statement, key_column, after=None, batch_size=1000):
+    """
+    Reads rows from the old database in key order with a server-side cursor
+    :param statement: select() from the old schema, must contain key_column
+    :param key_column: unique column the rows are ordered by
+    :param after: last key of the previous run, None to start from the beginning
+    :param batch_size: rows per batch
+    :return: generator of row lists
+    """
+    if after is not None:
+        statement = statement.where(key_column > after)
+    with get_old_engine().connect() as connection:
+        result = connection.execution_options(
+            stream_results=True, max_row_buffer=batch_size
+        ).execute(statement.order_by(key_column))
+        for batch in result.partitions(batch_size):
+            yield batch
+
+
+def upsert(entity, values, session, update=False, key=None, known=None):
+    """
+    bulk_exist_or_create(); with update=True the existing rows are found by a stable key
+    and updated in place with bulk_update(), only the others are inserted, so a change of
+    another column of the natural key (router ip, school name) does not create a second row
+    :param key: stable columns of the rows, for example ("sn",) for devices
+    :param known: ids already known for the rows, None where unknown (legacy_school_map)
+    :return: ids in the order of values
+    """
+    if not update:
+        return bulk_exist_or_create(entity, values, session, return_ids=True)
+    ids = list(known) if known else [None] * len(values)
+    if key:
+        lookup = [tuple(row[name] for name in key) for row, entity_id in zip(values, ids) if entity_id is None]
+        columns = [getattr(entity, name) for name in key]
+        existing = {}
+        for start in range(0, len(lookup), 1000):
+            for row in session.execute(
+                select(entity.id, *columns).where(tuple_(*columns).in_(lookup[start:start + 1000]))
+            ):
+                existing[tuple(row[1:])] = row.id
+        ids = [entity_id if entity_id is not None else existing.get(tuple(row[name] for name in key))
+               for row, entity_id in zip(values, ids)]
+    created = iter(bulk_exist_or_create(
+        entity, [row for row, entity_id in zip(values, ids) if entity_id is None], session, return_ids=True
+    ))
+    ids = [entity_id if entity_id is not None else next(created) for entity_id in ids]
+    bulk_update(entity, [dict(row, id=entity_id) for row, entity_id in zip(values, ids) if entity_id], session)
+    return ids
+
+
+def legacy_school_ids(old_ids, session):
+    """
+    :param old_ids: school ids of the old schema
+    :return: dict old id -> School.id
+    """
+    if not old_ids:
+        return {}
+    result = session.execute(
+        select(legacy_school_map.c.old_id, legacy_school_map.c.school_id)
+        .where(legacy_school_map.c.old_id.in_(list(old_ids)))
+    )
+    return dict(result.all())
+
+
+def map_legacy_schools(pairs, session):
+    """
+    :param pairs: list of (old id, School.id)
+    """
+    if not pairs:
+        return
+    statement = insert(legacy_school_map).values([dict(old_id=old_id, school_id=school_id) for old_id, school_id in pairs])
+    session.execute(statement.on_conflict_do_update(
+        index_elements=[legacy_school_map.c.old_id], set_=dict(school_id=statement.excluded.school_id)
+    ))
+
+
+def replace_networks(entity, values, school_ids, session):
+    """
+    Deletes the networks of the given schools that are not in `values` any more
+    :param entity: network table
+    :param values: current network rows of these schools
+    :param school_ids: schools of the batch
+    """
+    if not school_ids:
+        return
+    keep = [(row["school_id"], row["network"]) for row in values]
+    statement = delete(entity).where(entity.school_id.in_(school_ids))
+    if keep:
+        statement = statement.where(tuple_(entity.school_id, entity.network).notin_(keep))
+    deleted = session.execute(statement.execution_options(synchronize_session=False)).rowcount
+    if deleted:
+        logger.info(f"Sync {entity.__tablename__}: {deleted} old networks removed")
+
+
+def ids_by_name(entity, names, session):
+    """
+    :param entity: SQLAlchemy ORM object with unique `name` column
+    :param names: names to look up
+    :return: dict name -> id of the existing rows
+    """
+    names = [name for name in set(names) if name]
+    if not names:
+        return {}
+    result = session.execute(select(entity.name, entity.id).where(entity.name.in_(names)))
+    return dict(result.all())
+
+
+def migrate_districts(rows, session, update=False):
+    values = []
+    for row in rows:
+        if not row.district:
+            logger.error(f"Skip district {row.domain}: empty name")
+            continue
+        values.append(dict(
+            name=row.district,
+            name_en=row.shortname or row.domain,
+            full_name=row.district,
+            fqdn=row.domain,
+        ))
+    upsert(District, values, session, update)
+
+
+def migrate_wlc(rows, session, update=False):
+    values = []
+    for row in rows:
+        ip = isip(row.wlc_ip)
+        if not ip or not row.wlc_option:
+            logger.error(f"Skip WLC {row.name}: {row.wlc_ip=}, {row.wlc_option=}")
+            continue
+        values.append(dict(name=row.name, ip=ip, mgmt_ip=ip, option_43=row.wlc_option))
+    upsert(WLC, values, session, update)
+
+
+def migrate_prime(rows, session, update=False):
+    values = []
+    for row in rows:
+        ip = isip(row.ip)
+        if not row.name or not ip:
+            logger.error(f"Skip Prime {row.id}: {row.name=}, {row.ip=}")
+            continue
+        values.append(dict(name=row.name, ip=ip))
+    upsert(Prime, values, session, update)
+
+
+def migrate_schools(rows, session, update=False):
+    district_ids = ids_by_name(District, (row.district for row in rows), session)
+    wlc_ids = ids_by_name(WLC, (row.vwlc for row in rows), session)
+    prime_ids = ids_by_name(Prime, (row.prime for row in rows), session)
+    projects = list({row.project for row in rows if row.project})
+    project_ids = dict(zip(projects, bulk_exist_or_create(
+        Project, [dict(name=name) for name in projects], session, return_ids=True
+    )))
+
+    schools = []
+    for row in rows:
+        if not row.school or row.district not in district_ids:
+            logger.error(f"Skip school {row.id}: {row.school=}, {row.district=}")
+            continue
+        schools.append((row, dict(
+            name=row.school,
+            short_name=row.name,
+            full_name=row.school_full_name,
+            address=row.school_building_full_address or row.address,
+            district_id=district_ids[row.district],
+            wlc_id=wlc_ids.get(row.vwlc),
+            prime_id=prime_ids.get(row.prime),
+            project_id=project_ids.get(row.project),
+        )))
+    known = legacy_school_ids([row.id for row, _ in schools], session)
+    school_ids = upsert(School, [values for _, values in schools], session, update,
+                        known=[known.get(row.id) for row, _ in schools])
+    map_legacy_schools(
+        [(row.id, school_id) for (row, _), school_id in zip(schools, school_ids) if school_id is not None], session
+    )
+
+    kms_nets, users_nets, rt_nets, mgts_nets, sch_nets = [], [], [], [], []
+    for (row, _), school_id in zip(schools, school_ids):
+        if school_id is None:
+            continue
+        kms = parse_vlan_prefixes(row.net_pak, (30, 60, 70))
+        if "network" in kms:
+            kms_nets.append(dict(kms, school_id=school_id))
+        users = parse_vlan_prefixes(row.net_inner, (40, 50))
+        if "network" in users:
+            users_nets.append(dict(users, school_id=school_id))
+        rt_nets.extend(dict(school_id=school_id, network=net) for net in parse_prefixes(row.rt)[:1])
+        mgts_nets.extend(dict(school_id=school_id, network=net) for net in parse_prefixes(row.mgts)[:1])
+        sch_nets.extend(
+            dict(school_id=school_id, network=net, kms=True) for net in parse_prefixes(row.sch_all_pak_nets)
+        )
+    for entity, values in ((KMSNet, kms_nets), (UsersNet, users_nets), (RTNet, rt_nets),
+                           (MGTSNet, mgts_nets), (SchNet, sch_nets)):
+        upsert(entity, values, session, update)
+        if update:
+            replace_networks(entity, values, [school_id for school_id in school_ids if school_id], session)
+
+
+def model_ids(rows, session):
+    """
+    Creates missing vendors and models of a batch of old devices
+    :return: dict model name -> model id
+    """
+    vendors = list({row.vendor for row in rows if row.vendor})
+    vendor_ids = dict(zip(vendors, bulk_exist_or_create(
+        Vendor, [dict(name=name) for name in vendors], session, return_ids=True
+    )))
+    models = {}
+    for row in rows:
+        if row.model and vendor_ids.get(row.vendor):
+            models.setdefault(row.model, vendor_ids[row.vendor])
+    return dict(zip(models, bulk_exist_or_create(
+        Model, [dict(name=name, vendor_id=vendor_id) for name, vendor_id in models.items()],
+        session, return_ids=True,
+    )))
+
+
+def migrate_devices(entity, rows, session, update=False):
+    school_ids = ids_by_name(School, (row.school_name for row in rows), session)
+    models = model_ids(rows, session)
+    values = []
+    for row in rows:
+        ip = isip(row.ip)
+        if not row.name or not row.serial or not ip or row.school_name not in school_ids:
+            logger.error(f"Skip {entity.__name__} {row.id}: {row.name=}, {row.serial=}, "
+                         f"{row.ip=}, {row.school_name=}")
+            continue
+        values.append(dict(
+            name=row.name,
+            sn=row.serial,
+            ip=ip,
+            school_id=school_ids[row.school_name],
+            model_id=models.get(row.model),
+            os_version=row.os,
+        ))
+    upsert(entity, values, session, update, key=("sn",))
+
+
+def steps():
+    """
+    Migration steps in dependency order:
+    (name, select from old schema, key column, writer, updated_at column or None)
+    """
+    school_name = OldSchool.school.label("school_name")
+    return (
+        ("district", select(OldDidtrict), OldDidtrict.domain, migrate_districts, None),
+        ("wlc", select(OldWLC), OldWLC.name, migrate_wlc, None),
+        ("prime", select(OldPrime), OldPrime.id, migrate_prime, None),
+        ("school", select(OldSchool), OldSchool.id, migrate_schools, OldSchool.updated_at),
+        (
+            "router",
+            select(OldRouter, school_name).outerjoin(OldSchool, OldRouter.school_id == OldSchool.id),
+            OldRouter.id,
+            partial(migrate_devices, Router),
+            OldRouter.updated_at,
+        ),
+        (
+            "switch",
+            select(OldSwitch, school_name).outerjoin(
+                OldSchool, cast(OldSchool.id, String) == OldSwitch.school_id
+            ),
+            OldSwitch.id,
+            partial(migrate_devices, Switch),
+            OldSwitch.updated_at,
+        ),
+    )
+
+
+def migrate(session=None, checkpoint_path="etl_checkpoint.json", batch_size=1000, only=None):
+    """
+    Runs the migration old schema -> new schema, resuming from the checkpoint file
+    :param session: SQLAlchemy sesion to new database 'sqlalchemy.orm.session.Session', default session if None
+    :param checkpoint_path: JSON file with the last migrated key per step, None to disable
+    :param batch_size: rows per batch and per commit
+    :param only: names of the steps to run, all if None
+    :return: dict step -> number of source rows processed
+    """
+    session = session or get_session()
+    checkpoint = Checkpoint(checkpoint_path)
+    processed = {}
+    for name, statement, key_column, writer, _ in steps():
+        if only and name not in only:
+            continue
+        processed[name] = 0
+        logger.info(f"ETL step {name} from key {checkpoint.get(name)!r}")
+        for batch in stream(statement, key_column, checkpoint.get(name), batch_size):
+            try:
+                writer(batch, session)
+                session.commit()
+            except Exception:
+                session.rollback()
+                logger.error(f"ETL step {name} failed after key {checkpoint.get(name)!r}, batch rolled back")
+                raise
+            checkpoint.set(name, getattr(batch[-1], key_column.key))
+            processed[name] += len(batch)
+        logger.info(f"ETL step {name} done, {processed[name]} rows")
+    return processed
+
+
+def sync(session=None, watermark_path="etl_watermark.json", batch_size=1000, lag=300, only=None):
+    """
+    Incremental refresh old schema -> new schema.
+    Tables with updated_at are read in updated_at order from their high-water mark,
+    minus `lag` seconds for transactions committed late with an older timestamp
+    (rereading a row is a no-op), tables without it are small and read in full.
+    Existing rows get the changed values, networks of the changed schools are replaced.
+    :param session: SQLAlchemy sesion to new database 'sqlalchemy.orm.session.Session', default session if None
+    :param watermark_path: JSON file with the last updated_at per step, None to disable
+    :param batch_size: rows per batch and per commit
+    :param lag: seconds reread before the high-water mark
+    :param only: names of the steps to run, all if None
+    :return: dict step -> number of source rows processed
+    """
+    session = session or get_session()
+    watermark = Checkpoint(watermark_path)
+    processed = {}
+    for name, statement, key_column, writer, updated_column in steps():
+        if only and name not in only:
+            continue
+        processed[name] = 0
+        after = watermark.get(name)
+        if updated_column is not None and after:
+            statement = statement.where(updated_column >= datetime.fromisoformat(after) - timedelta(seconds=lag))
+        logger.info(f"Sync step {name} from {after!r}")
+        order = updated_column if updated_column is not None else key_column
+        for batch in stream(statement, order, None, batch_size):
+            try:
+                writer(batch, session, update=True)
+                session.commit()
+            except Exception:
+                session.rollback()
+                logger.error(f"Sync step {name} failed after {watermark.get(name)!r}, batch rolled back")
+                raise
+            if updated_column is not None:
+                watermark.set(name, batch[-1].updated_at.isoformat())
+            processed[name] += len(batch)
+        logger.info(f"Sync step {name} done, {processed[name]} rows")
+    return processed
+
+
+"""
+Keys compared by deletions(): new table, its key column, key column in the old schema.
+Schools are renamed, they are compared by the old id kept in legacy_school_map.
+"""
+DELETION_KEYS = (
+    ("switch", Switch.sn, OldSwitch.serial),
+    ("router", Router.sn, OldRouter.serial),
+    ("school", legacy_school_map.c.old_id, OldSchool.id),
+)
+
+
+def deletions(session=None, batch_size=10000):
+    """
+    Rows of the new database whose key is not in the old one any more,
+    only the key columns of both sides are read.
+    Report only: the new database also has rows that never came from the old one
+    (db_loader, manual changes), a missing key is not proof of a deletion upstream.
+    :param session: SQLAlchemy sesion to new database 'sqlalchemy.orm.session.Session', default session if None
+    :param batch_size: keys fetched from the server cursor at a time
+    :return: dict table -> list of keys missing in the old database (old ids for schools)
+    """
+    session = session or get_session()
+    missing = {}
+    for table, key_column, old_key_column in DELETION_KEYS:
+        with get_old_engine().connect() as connection:
+            old_keys = set(connection.execute(select(old_key_column).where(old_key_column.isnot(None))).scalars())
+        new_keys = session.execute(select(key_column).execution_options(yield_per=batch_size)).scalars()
+        keys = missing[table] = [key for key in new_keys if key not in old_keys]
+        logger.info(f"Deletions {table}: {len(keys)} rows not in the old database")
+    return missing
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Migrate the old school database into the new schema")
+    parser.add_argument("--checkpoint", default="etl_checkpoint.json")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--step", action="append", help="run only these steps")
+    parser.add_argument("--sync", action="store_true", help="incremental refresh from the high-water marks")
+    parser.add_argument("--watermark", default="etl_watermark.json")
+    parser.add_argument("--deletions", action="store_true", help="report rows missing in the old database")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    if args.deletions:
+        print({table: len(keys) for table, keys in deletions().items()})
+    elif args.sync:
+        print(sync(watermark_path=args.watermark, batch_size=args.batch_size, only=args.step))
+    else:
+        print(migrate(checkpoint_path=args.checkpoint, batch_size=args.batch_size, only=args.step))
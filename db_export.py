@@ -0,0 +1,178 @@
+import gzip
+import json
+import logging
+import argparse
+
+from sqlalchemy import select, func, Integer, Boolean, DateTime
+
+from db_orm import School, Router, Vendor, Switch, Model, District, KMSNet, UsersNet, RTNet
+from db_orm import MGTSNet, WLC, Prime, AP, Project, SchNet, get_session
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+
+"""
+Streaming export of the inventory to JSON lines or Parquet.
+Rows come from a server-side cursor in fixed-size chunks and are written
+chunk by chunk, no ORM objects are built, memory does not grow with the table.
+Parquet needs pyarrow.
+
+    python db_export.py switch switches.jsonl.gz
+    python db_export.py schools schools.parquet --compression zstd
+"""
+TABLES = {
+    entity.__tablename__: entity
+    for entity in (School, Router, Vendor, Switch, Model, District, KMSNet, UsersNet, RTNet,
+                   MGTSNet, WLC, Prime, AP, Project, SchNet)
+}
+
+
+def schools_query():
+    """
+    :return: select() of one denormalized row per school: names of district, project, WLC and Prime,
+             first router, first network of each network table, switch and AP counts
+    """
+    switches = select(Switch.school_id, func.count().label("switches")).group_by(Switch.school_id).subquery()
+    aps = select(AP.school_id, func.count().label("aps")).group_by(AP.school_id).subquery()
+    router = select(Router.name, Router.ip).where(Router.school_id == School.id).order_by(Router.id).limit(1)
+
+    def first_network(entity):
+        return (
+            select(entity.network).where(entity.school_id == School.id).order_by(entity.id).limit(1)
+            .scalar_subquery().label(entity.__tablename__)
+        )
+    return (
+        select(
+            School.id,
+            School.name,
+            School.short_name,
+            School.full_name,
+            School.address,
+            School.active,
+            District.name.label("district"),
+            Project.name.label("project"),
+            WLC.name.label("wlc"),
+            Prime.name.label("prime"),
+            router.with_only_columns(Router.name).scalar_subquery().label("router"),
+            router.with_only_columns(Router.ip).scalar_subquery().label("router_ip"),
+            first_network(KMSNet),
+            first_network(UsersNet),
+            first_network(RTNet),
+            first_network(MGTSNet),
+            func.coalesce(switches.c.switches, 0).label("switches"),
+            func.coalesce(aps.c.aps, 0).label("aps"),
+            School.created,
+            School.updated,
+        )
+        .outerjoin(District, School.district_id == District.id)
+        .outerjoin(Project, School.project_id == Project.id)
+        .outerjoin(WLC, School.wlc_id == WLC.id)
+        .outerjoin(Prime, School.prime_id == Prime.id)
+        .outerjoin(switches, switches.c.school_id == School.id)
+        .outerjoin(aps, aps.c.school_id == School.id)
+        .order_by(School.id)
+    )
+
+
+def table_query(entity):
+    """
+    :return: select() of all the columns of a table, in primary key order
+    """
+    return select(*entity.__table__.columns).order_by(entity.id)
+
+
+def stream_chunks(statement, chunk_size=10000, session=None):
+    """
+    :param statement: select()
+    :param chunk_size: rows per chunk
+    :param session: SQLAlchemy sesion to database 'sqlalchemy.orm.session.Session', default session if None
+    :return: generator of lists of row mappings
+    """
+    session = session or get_session()
+    result = session.execute(statement.execution_options(stream_results=True, max_row_buffer=chunk_size))
+    for partition in result.mappings().partitions(chunk_size):
+        yield partition
+
+
+def write_jsonl(statement, path, chunk_size=10000, compression=None, session=None):
+    """
+    :param compression: "gzip" or None, gzip also if path ends with .gz
+    :return: number of rows written
+    """
+    opener = gzip.open if compression == "gzip" or path.endswith(".gz") else open
+    rows = 0
+    with opener(path, "wt", encoding="utf-8") as file:
+        for chunk in stream_chunks(statement, chunk_size, session):
+            file.write("".join(json.dumps(dict(row), default=str, ensure_ascii=False) + "\n" for row in chunk))
+            rows += len(chunk)
+    return rows
+
+
+def write_parquet(statement, path, chunk_size=10000, compression="snappy", session=None):
+    """
+    One Parquet row group per chunk
+    :param compression: snappy, zstd, gzip, brotli, lz4 or None
+    :return: number of rows written
+    """
+    if pyarrow is None:
+        raise RuntimeError("Parquet export needs pyarrow: pip install pyarrow")
+    schema = pyarrow.schema([(column.name, _arrow_type(column.type)) for column in statement.selected_columns])
+    rows = 0
+    with pyarrow.parquet.ParquetWriter(path, schema, compression=compression or "none") as writer:
+        for chunk in stream_chunks(statement, chunk_size, session):
+            columns = {name: [row[name] for row in chunk] for name in schema.names}
+            for field in schema:
+                if pyarrow.types.is_string(field.type):
+                    columns[field.name] = [None if value is None else str(value) for value in columns[field.name]]
+            writer.write_table(pyarrow.Table.from_pydict(columns, schema=schema))
+            rows += len(chunk)
+    return rows
+
+
+def export(name, path, fmt=None, chunk_size=10000, compression=None, session=None):
+    """
+    Exports a table or the denormalized per-school view
+    :param name: table name (TABLES) or "schools"
+    :param path: output file
+    :param fmt: "jsonl" or "parquet", from the file extension if None
+    :param compression: gzip for JSON lines, Parquet codec for Parquet
+    :return: number of rows written
+    """
+    statement = schools_query() if name == "schools" else table_query(TABLES[name])
+    fmt = fmt or ("parquet" if path.endswith(".parquet") else "jsonl")
+    if fmt == "parquet":
+        rows = write_parquet(statement, path, chunk_size, compression or "snappy", session)
+    else:
+        rows = write_jsonl(statement, path, chunk_size, compression, session)
+    logger.info(f"Exported {rows} rows of {name} to {path}")
+    return rows
+
+
+def _arrow_type(column_type):
+    if isinstance(column_type, Integer):
+        return pyarrow.int64()
+    if isinstance(column_type, Boolean):
+        return pyarrow.bool_()
+    if isinstance(column_type, DateTime):
+        return pyarrow.timestamp("us")
+    return pyarrow.string()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export the inventory to JSON lines or Parquet")
+    parser.add_argument("name", choices=sorted(TABLES) + ["schools"])
+    parser.add_argument("path")
+    parser.add_argument("--format", choices=("jsonl", "parquet"))
+    parser.add_argument("--chunk-size", type=int, default=10000)
+    parser.add_argument("--compression")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    export(args.name, args.path, args.format, args.chunk_size, args.compression)
@@ -0,0 +1,96 @@
+import logging
+
+from sqlalchemy import select, cast, or_
+from sqlalchemy.dialects.postgresql import INET
+
+from db_orm import Router, Switch, KMSNet, UsersNet, RTNet, MGTSNet, WLC, Prime, AP, SchNet, get_session
+
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+
+"""
+Containment searches done by PostgreSQL with the native inet/cidr operators,
+backed by the GiST inet_ops indexes of migrations/0001_inet_gist_indexes.sql
+and migrations/0005_inet_gist_vlan_indexes.sql.
+A network matches if its `network` or any of its VLAN subnets matches.
+"""
+NETWORK_TABLES = (KMSNet, UsersNet, RTNet, MGTSNet, SchNet)
+DEVICE_TABLES = (Router, Switch, AP, WLC, Prime)
+NETWORK_COLUMNS = {
+    KMSNet: ("network", "vlan30", "vlan60", "vlan70"),
+    UsersNet: ("network", "vlan40", "vlan50"),
+}
+
+
+def inet_within(column, prefix, strict=False):
+    """ column << prefix (strict) or column <<= prefix """
+    return column.op("<<" if strict else "<<=")(cast(prefix, INET))
+
+
+def inet_contains(column, address, strict=False):
+    """ column >> address (strict) or column >>= address """
+    return column.op(">>" if strict else ">>=")(cast(address, INET))
+
+
+def inet_overlaps(column, prefix):
+    """ column && prefix, one contains the other """
+    return column.op("&&")(cast(prefix, INET))
+
+
+def nets_containing(address, entities=NETWORK_TABLES, session=None):
+    """
+    Networks containing an address or a prefix
+    :param address: "10.1.1.1" or "10.1.1.0/26"
+    :param entities: network tables to search
+    :param session: SQLAlchemy sesion to database 'sqlalchemy.orm.session.Session', default session if None
+    :return: list of network objects
+    """
+    return _search(entities, NETWORK_COLUMNS, lambda column: inet_contains(column, address), session)
+
+
+def nets_within(prefix, entities=NETWORK_TABLES, session=None, strict=False):
+    """
+    Networks inside a prefix
+    :param prefix: "10.1.0.0/16"
+    :param entities: network tables to search
+    :param session: SQLAlchemy sesion to database 'sqlalchemy.orm.session.Session', default session if None
+    :param strict: exclude the prefix itself
+    :return: list of network objects
+    """
+    return _search(entities, NETWORK_COLUMNS, lambda column: inet_within(column, prefix, strict), session)
+
+
+def nets_overlapping(prefix, entities=NETWORK_TABLES, session=None):
+    """
+    Networks containing or contained by a prefix, for example to check a new allocation
+    :param prefix: "10.1.0.0/16"
+    :param entities: network tables to search
+    :param session: SQLAlchemy sesion to database 'sqlalchemy.orm.session.Session', default session if None
+    :return: list of network objects
+    """
+    return _search(entities, NETWORK_COLUMNS, lambda column: inet_overlaps(column, prefix), session)
+
+
+def devices_within(prefix, entities=DEVICE_TABLES, session=None):
+    """
+    Devices with an address inside a prefix
+    :param prefix: "10.1.0.0/16"
+    :param entities: device tables to search
+    :param session: SQLAlchemy sesion to database 'sqlalchemy.orm.session.Session', default session if None
+    :return: list of device objects
+    """
+    return _search(entities, {}, lambda column: inet_within(column, prefix), session, default=("ip",))
+
+
+def _search(entities, columns, condition, session=None, default=("network",)):
+    """
+    :param columns: dict entity -> names of the searched columns, `default` for the other entities
+    """
+    session = session or get_session()
+    found = []
+    for entity in entities:
+        conditions = [condition(getattr(entity, name)) for name in columns.get(entity, default)]
+        found.extend(session.execute(select(entity).where(or_(*conditions))).scalars())
+    return found
@@ -0,0 +1,95 @@
+import logging
+
+from sqlalchemy import select
+
+from db_orm import School, Router, Switch, Model, District, AP, Project, Credentials
+from db_orm import get_session, netmiko_params, scrapli_params
+
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+
+"""
+Connection parameters for whole device inventories.
+One joined query per device type (device -> model -> credentials -> school),
+streamed from the server, instead of two lazy loads per device in *_params().
+WLC and Prime have no model, so no credentials, they are not part of the inventory.
+"""
+DEVICE_TYPES = (Router, Switch, AP)
+
+
+def inventory_query(entity, district=None, project=None, school=None):
+    """
+    :param entity: Router, Switch or AP
+    :param district: District.name or list of names
+    :param project: Project.name or list of names
+    :param school: School.name or list of names
+    :return: select() of device id, name, ip and credentials columns
+    """
+    if entity not in DEVICE_TYPES:
+        raise ValueError(f"{entity.__name__} has no model, connection parameters are unknown")
+    statement = (
+        select(
+            entity.id,
+            entity.name,
+            entity.ip,
+            Credentials.username,
+            Credentials.password,
+            Credentials.enable_pass,
+            Credentials.netmiko_device,
+            Credentials.scrapli_driver,
+            Credentials.scrapli_transport,
+        )
+        .join(Model, entity.model_id == Model.id)
+        .join(Credentials, Model.credentials_id == Credentials.id)
+        .where(entity.ip.isnot(None))
+        .order_by(entity.id)
+    )
+    if district or project or school:
+        statement = statement.join(School, entity.school_id == School.id)
+    if district:
+        statement = statement.join(District, School.district_id == District.id).where(
+            District.name.in_(_names(district))
+        )
+    if project:
+        statement = statement.join(Project, School.project_id == Project.id).where(
+            Project.name.in_(_names(project))
+        )
+    if school:
+        statement = statement.where(School.name.in_(_names(school)))
+    return statement
+
+
+def iter_connection_params(device_type=None, style="netmiko", district=None, project=None, school=None,
+                           session=None, yield_per=1000):
+    """
+    Streams connection parameters of all devices of a type, or of all types,
+    one query per type whatever the number of devices.
+        for entity, device_id, name, params in iter_connection_params(Switch, district="ЦАО"):
+            ConnectHandler(**params)
+    :param device_type: Router, Switch or AP, all of DEVICE_TYPES if None
+    :param style: "netmiko" or "scrapli"
+    :param district: District.name or list of names
+    :param project: Project.name or list of names
+    :param school: School.name or list of names
+    :param session: SQLAlchemy sesion to database 'sqlalchemy.orm.session.Session', default session if None
+    :param yield_per: rows fetched from the server cursor at a time
+    :return: generator of (entity, device id, device name, params dict)
+    """
+    if style not in ("netmiko", "scrapli"):
+        raise ValueError(f"Unknown connection params style {style!r}")
+    session = session or get_session()
+    for entity in (device_type,) if device_type else DEVICE_TYPES:
+        statement = inventory_query(entity, district, project, school).execution_options(stream_results=True)
+        for row in session.execute(statement).yield_per(yield_per):
+            if style == "netmiko":
+                params = netmiko_params(row.netmiko_device, row.ip, row.username, row.password, row.enable_pass)
+            else:
+                params = scrapli_params(row.scrapli_driver, row.scrapli_transport, row.ip,
+                                        row.username, row.password, row.enable_pass)
+            yield entity, row.id, row.name, params
+
+
+def _names(value):
+    return [value] if isinstance(value, str) else list(value)
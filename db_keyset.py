@@ -0,0 +1,113 @@
+import json
+import base64
+import logging
+
+from sqlalchemy import select
+
+from db_orm import get_session
+
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+
+"""
+Keyset (seek) pagination over any db_orm model: every page is
+WHERE column > last value ORDER BY column LIMIT page_size, an index range scan
+that costs the same on the first and on the last page, unlike OFFSET.
+The column is the primary key or a unique column (name, sn, mac, ip...), all of
+them are indexed by their unique constraint. Each page is expunged from the session
+once the caller moves to the next one, so a full-table walk holds one page in memory.
+`cursor` is an opaque token of the end of the last returned page, a new Keyset
+started with it continues after that page, for example in the next run of a job:
+
+    keyset = Keyset(AP, "mac", page_size=5000, school_id=42)
+    for page in keyset.pages():
+        check(page)
+        save(keyset.cursor)
+    ...
+    for ap in Keyset(AP, "mac", school_id=42, cursor=load()):
+        ...
+"""
+
+
+class Keyset:
+    def __init__(self, entity, column="id", page_size=1000, session=None, where=(), cursor=None, **filter_by):
+        """
+        :param entity: SQLAlchemy ORM object
+        :param column: name of the primary key or of a unique column to page by
+        :param page_size: objects per query
+        :param session: SQLAlchemy sesion to database 'sqlalchemy.orm.session.Session', default session if None
+        :param where: additional SQL conditions, for example (AP.ip.isnot(None),)
+        :param cursor: token from a previous Keyset over the same entity and column, start after it
+        :param filter_by: column=value filters, as for exist()
+        """
+        self.entity = entity
+        self.column = getattr(entity, column)
+        if not (self.column.primary_key or self.column.unique):
+            raise ValueError(f"{entity.__name__}.{column} is not unique, keyset pagination needs a unique column")
+        self.page_size = page_size
+        self.session = session or get_session()
+        self.statement = select(entity).filter_by(**filter_by)
+        for condition in where:
+            self.statement = self.statement.where(condition)
+        self.after = decode_cursor(cursor, entity, column) if cursor else None
+        self.pages_read = 0
+
+    @property
+    def cursor(self):
+        """
+        :return: token of the end of the last returned page, None before the first one
+        """
+        return encode_cursor(self.entity, self.column.key, self.after) if self.after is not None else None
+
+    def pages(self):
+        """
+        :return: generator of lists of objects, a page is expunged when the next one is requested
+        """
+        while True:
+            statement = self.statement
+            if self.after is not None:
+                statement = statement.where(self.column > self.after)
+            page = self.session.execute(statement.order_by(self.column).limit(self.page_size)).scalars().all()
+            if not page:
+                return
+            self.after = getattr(page[-1], self.column.key)
+            self.pages_read += 1
+            logger.debug(f"Keyset {self.entity.__tablename__}: page {self.pages_read} up to {self.after!r}")
+            yield page
+            for obj in page:
+                if obj in self.session:
+                    self.session.expunge(obj)
+            if len(page) < self.page_size:
+                return
+
+    def __iter__(self):
+        for page in self.pages():
+            yield from page
+
+
+def keyset(entity, column="id", page_size=1000, session=None, where=(), cursor=None, **filter_by):
+    """
+    :return: generator of objects of the whole table, see Keyset
+    """
+    return iter(Keyset(entity, column, page_size, session, where, cursor, **filter_by))
+
+
+def encode_cursor(entity, column, value):
+    data = json.dumps({"table": entity.__tablename__, "column": column, "after": value}, default=str)
+    return base64.urlsafe_b64encode(data.encode()).decode()
+
+
+def decode_cursor(cursor, entity, column):
+    """
+    :return: last value of the cursor
+    """
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except ValueError as error:
+        raise ValueError(f"Incorrect keyset cursor {cursor!r}: {error}") from None
+    if data.get("table") != entity.__tablename__ or data.get("column") != column:
+        raise ValueError(f"Keyset cursor of {data.get('table')}.{data.get('column')}, "
+                         f"not of {entity.__tablename__}.{column}")
+    return data["after"]
@@ -0,0 +1,346 @@
+import io
+import os
+import csv
+import json
+import logging
+import argparse
+
+from string import hexdigits
+from collections import namedtuple
+
+from db_orm import get_session, validate_ips, validate_nets
+
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+
+"""
+Bulk loader for inventory files (CSV, JSON array or JSON lines), one kind of rows per file.
+Rows are checked in Python (required values, text length, ip/prefix/mac syntax), streamed into
+a temporary staging table with COPY FROM STDIN, foreign keys are resolved by name
+with joins (district, project, wlc, prime, school, model), and the result is merged
+into the target table with INSERT ... ON CONFLICT DO UPDATE, all in one transaction.
+The merge only changes the columns the file has, and a blank value keeps the stored one,
+so a sheet without `mac` or `model` doesn't clear them on the existing rows.
+Every rejected row is reported with its number in the file and the reason,
+a failure of the load itself rolls the whole transaction back.
+
+    python db_loader.py switch wave_2023_switches.csv --rejects rejects.csv
+"""
+LoadSpec = namedtuple("LoadSpec", "table columns required references constraint key secondary defaults",
+                      defaults=({},))
+Reference = namedtuple("Reference", "column table fk required")
+VARCHAR_LENGTH = 255  # every VARCHAR column of db_schema.sql
+
+SCHOOL = Reference("school", "school", "school_id", True)
+MODEL = Reference("model", "model", "model_id", False)
+
+SPECS = {
+    "school": LoadSpec(
+        "school",
+        {"name": "varchar", "short_name": "varchar", "full_name": "varchar", "address": "varchar"},
+        ("name",),
+        (Reference("district", "district", "district_id", True), Reference("project", "project", "project_id", False),
+         Reference("wlc", "wlc", "wlc_id", False), Reference("prime", "prime", "prime_id", False)),
+        "school_name_unique", ("name",), (),
+    ),
+    "router": LoadSpec(
+        "router",
+        {"name": "varchar", "sn": "varchar", "ip": "inet", "os_version": "varchar"},
+        ("name", "sn", "ip"), (SCHOOL, MODEL),
+        "router_name_sn_ip_unique", ("name", "sn", "ip"), (),
+    ),
+    "switch": LoadSpec(
+        "switch",
+        {"name": "varchar", "sn": "varchar", "ip": "inet", "mac": "macaddr", "os_version": "varchar"},
+        ("name", "sn", "ip"), (SCHOOL, MODEL),
+        "switch_sn_unique", ("sn",), ("name", "ip"),
+    ),
+    "ap": LoadSpec(
+        "ap",
+        {"mac": "macaddr", "sn": "varchar", "name": "varchar", "ip": "inet"},
+        ("mac", "sn", "name"), (SCHOOL, Reference("model", "model", "model_id", True)),
+        "ap_mac_unique", ("mac",), ("sn",),
+    ),
+    "kms_net": LoadSpec(
+        "kms_net", {"network": "cidr", "vlan30": "cidr", "vlan60": "cidr", "vlan70": "cidr"},
+        ("network",), (SCHOOL,), "kms_net_school_id_network_unique", ("school_id", "network"), (),
+    ),
+    "users_net": LoadSpec(
+        "users_net", {"network": "cidr", "vlan40": "cidr", "vlan50": "cidr"},
+        ("network",), (SCHOOL,), "users_net_school_id_network_unique", ("school_id", "network"), (),
+    ),
+    "rt_net": LoadSpec(
+        "rt_net", {"network": "cidr"},
+        ("network",), (SCHOOL,), "rt_net_school_id_network_unique", ("school_id", "network"), (),
+    ),
+    "mgts_net": LoadSpec(
+        "mgts_net", {"network": "cidr"},
+        ("network",), (SCHOOL,), "mgts_school_id_network_unique", ("school_id", "network"), (),
+    ),
+    "sch_net": LoadSpec(
+        "sch_net", {"network": "cidr", "description": "varchar", "kms": "boolean"},
+        ("network",), (SCHOOL,), "sch_net_school_id_network_unique", ("school_id", "network"), (),
+        {"kms": "false"},
+    ),
+}
+
+Reject = namedtuple("Reject", "row reason")
+
+
+def read_rows(path):
+    """
+    :param path: .csv with a header line, .jsonl with one object per line or .json with an array
+    :return: generator of dicts
+    """
+    if path.endswith(".csv"):
+        with open(path, newline="", encoding="utf-8-sig") as file:
+            yield from csv.DictReader(file)
+    elif path.endswith(".jsonl"):
+        with open(path, encoding="utf-8") as file:
+            for line in file:
+                if line.strip():
+                    yield json.loads(line)
+    elif path.endswith(".json"):
+        with open(path, encoding="utf-8") as file:
+            yield from json.load(file)
+    else:
+        raise ValueError(f"Unknown inventory file format: {path}")
+
+
+def load(kind, rows, session=None, commit=True, chunk_size=10000):
+    """
+    Loads rows of one kind into the database
+    :param kind: one of SPECS: school, router, switch, ap, kms_net, users_net, rt_net, mgts_net, sch_net
+    :param rows: iterable of dicts, for example read_rows(path)
+    :param session: SQLAlchemy sesion to database 'sqlalchemy.orm.session.Session', default session if None
+    :param commit: commit the transaction if True, else need commit() outside.
+    :param chunk_size: rows validated at a time while streaming to COPY
+    :return: dict with rows, inserted, updated and list of Reject(row, reason)
+    """
+    spec = SPECS[kind]
+    session = session or get_session()
+    rejects = []
+
+    cursor = session.connection().connection.cursor()
+    try:
+        total, merged = _merge(spec, rows, rejects, chunk_size, cursor)
+        if commit:
+            session.commit()
+    except Exception as error:
+        logger.error(f"Load {kind} failed, transaction rolled back: {error}")
+        session.rollback()
+        raise
+    finally:
+        cursor.close()
+
+    report = {
+        "rows": total,
+        "inserted": sum(merged),
+        "updated": len(merged) - sum(merged),
+        "rejected": sorted(rejects),
+    }
+    logger.info(f"Load {kind}: {report['rows']} rows, {report['inserted']} inserted, "
+                f"{report['updated']} updated, {len(rejects)} rejected")
+    return report
+
+
+def _merge(spec, rows, rejects, chunk_size, cursor):
+    """
+    Stages, checks and merges the rows with the DB-API cursor, rejected rows are added to `rejects`
+    :return: number of rows read, list of inserted flags of the merged rows (False if updated)
+    """
+    input_columns = list(spec.columns) + [reference.column for reference in spec.references]
+    supplied = set()
+    cursor.execute(
+        f"CREATE TEMP TABLE load_stage (row_no integer, {', '.join(f'{c} text' for c in input_columns)})"
+        f" ON COMMIT DROP"
+    )
+    cursor.execute("CREATE TEMP TABLE load_reject (row_no integer, reason text) ON COMMIT DROP")
+    stream = _CopyStream(_staged(spec, input_columns, rows, rejects, supplied, chunk_size))
+    cursor.copy_expert(f"COPY load_stage (row_no, {', '.join(input_columns)}) FROM STDIN WITH (FORMAT csv)", stream)
+    total = stream.rows + len(rejects)
+
+    resolved = ["s.row_no"]
+    for column, type_ in spec.columns.items():
+        value = f"s.{column}::{type_}"
+        if column in spec.defaults:
+            value = f"COALESCE({value}, {spec.defaults[column]})"
+        resolved.append(f"{value} AS {column}")
+    joins = []
+    for number, reference in enumerate(spec.references):
+        resolved.append(f"r{number}.id AS {reference.fk}")
+        joins.append(f"LEFT JOIN {reference.table} r{number} ON r{number}.name = s.{reference.column}")
+    cursor.execute(f"CREATE TEMP TABLE load_resolved ON COMMIT DROP AS "
+                   f"SELECT {', '.join(resolved)} FROM load_stage s {' '.join(joins)}")
+
+    for number, reference in enumerate(spec.references):
+        cursor.execute(
+            f"INSERT INTO load_reject SELECT s.row_no, 'unknown {reference.column} ' || quote_literal(s.{reference.column})"
+            f" FROM load_stage s JOIN load_resolved r USING (row_no)"
+            f" WHERE s.{reference.column} IS NOT NULL AND r.{reference.fk} IS NULL"
+        )
+        if reference.required:
+            cursor.execute(f"INSERT INTO load_reject SELECT row_no, 'missing {reference.column}'"
+                           f" FROM load_stage WHERE {reference.column} IS NULL")
+    key = ", ".join(spec.key)
+    cursor.execute(
+        f"INSERT INTO load_reject SELECT row_no, 'duplicate of a later row in the file' FROM ("
+        f"SELECT row_no, row_number() OVER (PARTITION BY {key} ORDER BY row_no DESC) AS copy"
+        f" FROM load_resolved WHERE row_no NOT IN (SELECT row_no FROM load_reject)) duplicates WHERE copy > 1"
+    )
+    for column in spec.secondary:
+        cursor.execute(
+            f"INSERT INTO load_reject SELECT r.row_no, '{column} belongs to another {spec.table}'"
+            f" FROM load_resolved r JOIN {spec.table} t ON t.{column} = r.{column}"
+            f" WHERE ({', '.join(f't.{c}' for c in spec.key)}) <> ({', '.join(f'r.{c}' for c in spec.key)})"
+        )
+    for column in spec.secondary:
+        cursor.execute(
+            f"INSERT INTO load_reject SELECT row_no, '{column} also in a later row of the file' FROM ("
+            f"SELECT row_no, row_number() OVER (PARTITION BY {column} ORDER BY row_no DESC) AS copy"
+            f" FROM load_resolved WHERE {column} IS NOT NULL"
+            f" AND row_no NOT IN (SELECT row_no FROM load_reject)) duplicates WHERE copy > 1"
+        )
+
+    target_columns = list(spec.columns) + [reference.fk for reference in spec.references]
+    # only the columns of the file are merged, a blank value keeps the stored one (a default if it has one)
+    updated = {
+        column: f"EXCLUDED.{column}" if column in spec.defaults else f"COALESCE(EXCLUDED.{column}, {spec.table}.{column})"
+        for column in spec.columns if column in supplied and column not in spec.key
+    }
+    updated.update(
+        (reference.fk, f"COALESCE(EXCLUDED.{reference.fk}, {spec.table}.{reference.fk})")
+        for reference in spec.references if reference.column in supplied and reference.fk not in spec.key
+    )
+    if updated:
+        conflict = (
+            f"DO UPDATE SET {', '.join(f'{c} = {value}' for c, value in updated.items())}"
+            f" WHERE ({', '.join(f'{spec.table}.{c}' for c in updated)})"
+            f" IS DISTINCT FROM ({', '.join(updated.values())})"
+        )
+    else:
+        conflict = "DO NOTHING"
+    cursor.execute(
+        f"INSERT INTO {spec.table} ({', '.join(target_columns)})"
+        f" SELECT {', '.join(target_columns)} FROM load_resolved"
+        f" WHERE row_no NOT IN (SELECT row_no FROM load_reject)"
+        f" ON CONFLICT ON CONSTRAINT {spec.constraint} {conflict}"
+        f" RETURNING (xmax = 0) AS inserted"
+    )
+    merged = [inserted for inserted, in cursor.fetchall()]
+    cursor.execute("SELECT row_no, min(reason) FROM load_reject GROUP BY row_no")
+    rejects.extend(Reject(row_no, reason) for row_no, reason in cursor.fetchall())
+    cursor.execute("DROP TABLE load_stage, load_resolved, load_reject")
+    return total, merged
+
+
+def _staged(spec, input_columns, rows, rejects, supplied, chunk_size):
+    """
+    Checks rows chunk by chunk, rejected ones go to `rejects`, valid ones are yielded as lists,
+    the names of the columns found in the rows are added to `supplied`
+    """
+    chunk = []
+    for row_no, row in enumerate(rows, 1):
+        supplied.update(row.keys())
+        chunk.append((row_no, {column: _text(row.get(column)) for column in input_columns}))
+        if len(chunk) >= chunk_size:
+            yield from _checked(spec, input_columns, chunk, rejects)
+            chunk = []
+    yield from _checked(spec, input_columns, chunk, rejects)
+
+
+def _checked(spec, input_columns, chunk, rejects):
+    bad = {}
+    for column in spec.required:
+        for row_no, values in chunk:
+            if values[column] is None:
+                bad.setdefault(row_no, f"missing {column}")
+    for column, kind in spec.columns.items():
+        present = [(row_no, values) for row_no, values in chunk if values[column] is not None]
+        if kind in ("inet", "cidr"):
+            validate = validate_ips if kind == "inet" else validate_nets
+            normalized, errors = validate([values[column] for _, values in present])
+            for (_, values), value in zip(present, normalized):
+                values[column] = value
+            for error in errors:
+                bad.setdefault(present[error.index][0], f"incorrect {column} {error.value!r}: {error.reason}")
+        elif kind == "macaddr":
+            for row_no, values in present:
+                mac = "".join(char for char in values[column].lower() if char in hexdigits)
+                if len(mac) != 12:
+                    bad.setdefault(row_no, f"incorrect {column} {values[column]!r}")
+                values[column] = mac
+        elif kind == "varchar":
+            for row_no, values in present:
+                if len(values[column]) > VARCHAR_LENGTH:
+                    bad.setdefault(row_no, f"{column} longer than {VARCHAR_LENGTH} characters")
+        elif kind == "boolean":
+            for row_no, values in present:
+                flag = values[column].lower()
+                if flag not in ("true", "false", "t", "f", "1", "0", "yes", "no"):
+                    bad.setdefault(row_no, f"incorrect {column} {values[column]!r}")
+                values[column] = "t" if flag in ("true", "t", "1", "yes") else "f"
+    for row_no, values in chunk:
+        if row_no in bad:
+            rejects.append(Reject(row_no, bad[row_no]))
+        else:
+            yield [row_no] + [values[column] for column in input_columns]
+
+
+def _text(value):
+    if value is None:
+        return None
+    value = str(value).strip()
+    return value or None
+
+
+class _CopyStream:
+    """
+    File-like object for cursor.copy_expert(), encodes rows as CSV while COPY reads
+    """
+    def __init__(self, rows):
+        self.rows = 0
+        self._rows = iter(rows)
+        self._buffer = io.StringIO()
+        self._writer = csv.writer(self._buffer)
+        self._pending = ""
+
+    def read(self, size=65536):
+        while len(self._pending) < size:
+            row = next(self._rows, None)
+            if row is None:
+                break
+            self._writer.writerow(row)
+            self.rows += 1
+            if self._buffer.tell() >= size:
+                self._pending += self._buffer.getvalue()
+                self._buffer.seek(0)
+                self._buffer.truncate()
+        self._pending += self._buffer.getvalue()
+        self._buffer.seek(0)
+        self._buffer.truncate()
+        data, self._pending = self._pending[:size], self._pending[size:]
+        return data
+
+
+def write_rejects(path, rejects):
+    with open(path, "w", newline="") as file:
+        writer = csv.writer(file)
+        writer.writerow(["row", "reason"])
+        writer.writerows(rejects)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bulk load an inventory file")
+    parser.add_argument("kind", choices=sorted(SPECS))
+    parser.add_argument("path")
+    parser.add_argument("--rejects", help="CSV file for the rejected rows")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    result = load(args.kind, read_rows(args.path))
+    if args.rejects:
+        write_rejects(args.rejects, result["rejected"])
+    print(f"{os.path.basename(args.path)}: {result['rows']} rows, {result['inserted']} inserted, "
+          f"{result['updated']} updated, {len(result['rejected'])} rejected")
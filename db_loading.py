@@ -0,0 +1,154 @@
+import logging
+
+from sqlalchemy import select
+from sqlalchemy.orm import selectinload, joinedload
+
+from db_orm import School, Router, Switch, AP, get_session, get_session_factory
+from db_profiler import QueryProfiler
+
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+
+"""
+Named relationship loading profiles: a School or device graph in a fixed number of queries.
+Many-to-one relations (district, wlc, prime, project, school, model, vendor, creds)
+are joined into the main query, collections (router, switches, ap, networks) are
+loaded with one SELECT ... WHERE school_id IN (...) each, so loading N objects with a
+profile costs 1 + number of collections queries whatever N is (SQLAlchemy splits
+the IN list every 500 parents, so page through larger sets).
+
+    schools = load(School, "full", district_id=3)
+    for school in schools:
+        print(school.district.name, len(school.switches), school.kms_net)  # no query
+
+A profile is a list of paths, a path is a list of (strategy, relationship) steps.
+check_profiles() counts the queries of every profile for several page sizes
+and touches every loaded relationship: counts must not depend on the size.
+"""
+NETWORK = [[("selectin", name)] for name in ("kms_net", "users_net", "rt_net", "mgts_net", "sch_net")]
+DEVICES = [[("selectin", name)] for name in ("router", "switches", "ap")]
+SCHOOL_REFERENCES = [[("joined", name)] for name in ("district", "wlc", "prime", "project")]
+MODEL = [[("joined", "model"), ("joined", "vendor")], [("joined", "model"), ("joined", "creds")]]
+
+
+def _device_profiles():
+    school = [("joined", "school")]
+    return {
+        "network": [school] + [school + path for path in NETWORK],
+        "devices": MODEL,
+        "full": [school + path for path in SCHOOL_REFERENCES + NETWORK] + MODEL,
+    }
+
+
+PROFILES = {
+    School: {
+        "network": NETWORK,
+        "devices": DEVICES,
+        "full": SCHOOL_REFERENCES + NETWORK + DEVICES,
+    },
+    Router: _device_profiles(),
+    Switch: _device_profiles(),
+    AP: _device_profiles(),
+}
+STRATEGIES = {"selectin": selectinload, "joined": joinedload}
+
+
+def options(entity, profile):
+    """
+    :param entity: School, Router, Switch or AP
+    :param profile: "network", "devices" or "full"
+    :return: list of loader options for select(entity).options(...)
+    """
+    try:
+        paths = PROFILES[entity][profile]
+    except KeyError:
+        raise ValueError(f"No loading profile {profile!r} for {entity.__name__}") from None
+    loader_options = []
+    for path in paths:
+        option, owner = None, entity
+        for strategy, name in path:
+            attribute = getattr(owner, name)
+            if option is None:
+                option = STRATEGIES[strategy](attribute)
+            else:
+                option = getattr(option, f"{strategy}load")(attribute)
+            owner = attribute.property.mapper.class_
+        loader_options.append(option)
+    return loader_options
+
+
+def load(entity, profile="full", session=None, where=(), limit=None, **filter_by):
+    """
+    :param entity: School, Router, Switch or AP
+    :param profile: "network", "devices" or "full"
+    :param session: SQLAlchemy sesion to database 'sqlalchemy.orm.session.Session', default session if None
+    :param where: additional SQL conditions
+    :param limit: maximum number of objects
+    :param filter_by: column=value filters, as for exist()
+    :return: list of objects, ordered by id, with the relations of the profile loaded
+    """
+    session = session or get_session()
+    statement = select(entity).options(*options(entity, profile)).filter_by(**filter_by).order_by(entity.id)
+    for condition in where:
+        statement = statement.where(condition)
+    if limit is not None:
+        statement = statement.limit(limit)
+    return session.execute(statement).unique().scalars().all()
+
+
+def touch(obj, paths):
+    """
+    Reads every relationship of the profile paths, as a caller of the profile would
+    """
+    for path in paths:
+        objects = [obj]
+        for _, name in path:
+            loaded = []
+            for parent in objects:
+                value = getattr(parent, name)
+                if isinstance(value, list):
+                    loaded.extend(value)
+                elif value is not None:
+                    loaded.append(value)
+            objects = loaded
+
+
+def query_count(entity, profile, size, session_factory=None):
+    """
+    :return: number of statements run to load `size` objects with the profile and touch all its relations
+    """
+    session = (session_factory or get_session_factory())()
+    profiler = QueryProfiler().attach(session.get_bind())
+    try:
+        for obj in load(entity, profile, session, limit=size):
+            touch(obj, PROFILES[entity][profile])
+    finally:
+        profiler.detach()
+        session.close()
+    return sum(stats["count"] for stats in profiler.statements.values())
+
+
+def check_profiles(sizes=(1, 10, 100), session_factory=None):
+    """
+    Query-count check of all the profiles, for a database with at least max(sizes) rows per entity
+    :return: dict "Entity.profile" -> {size: queries} of the profiles whose count depends on the size,
+             empty if all are constant
+    """
+    failures = {}
+    for entity, profiles in PROFILES.items():
+        for profile in profiles:
+            counts = {size: query_count(entity, profile, size, session_factory) for size in sizes}
+            logger.info(f"{entity.__name__}.{profile}: {counts}")
+            if len(set(counts.values())) != 1:
+                failures[f"{entity.__name__}.{profile}"] = counts
+    return failures
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    failures = check_profiles()
+    for name, counts in failures.items():
+        print(f"{name}: query count depends on size {counts}")
+    raise SystemExit(1 if failures else 0)
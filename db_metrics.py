@@ -0,0 +1,113 @@
+import threading
+
+from bisect import bisect_left
+from functools import wraps
+from time import perf_counter
+
+
+"""
+Counters and latency histograms of the db_orm helpers, kept in memory
+and exported in the Prometheus text format:
+
+    from db_metrics import metrics
+    open("/var/lib/node_exporter/tool_db_sch.prom", "w").write(metrics.to_prometheus())
+"""
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+class Metrics:
+    def __init__(self, prefix="tool_db_sch", buckets=BUCKETS):
+        self.prefix = prefix
+        self.buckets = buckets
+        self.enabled = True
+        self._latency = {}  # (operation, entity) -> [count per bucket..., count over last bucket]
+        self._sum = {}  # (operation, entity) -> total seconds
+        self._exist = {}  # (entity, "hit" | "miss") -> count
+        self._lock = threading.Lock()
+
+    def observe(self, operation, entity, seconds):
+        key = (operation, entity)
+        bucket = bisect_left(self.buckets, seconds)
+        with self._lock:
+            counts = self._latency.get(key)
+            if counts is None:
+                counts = self._latency[key] = [0] * (len(self.buckets) + 1)
+                self._sum[key] = 0.0
+            counts[bucket] += 1
+            self._sum[key] += seconds
+
+    def exist_result(self, entity, hit):
+        key = (entity, "hit" if hit else "miss")
+        with self._lock:
+            self._exist[key] = self._exist.get(key, 0) + 1
+
+    def calls(self, operation, entity):
+        return sum(self._latency.get((operation, entity), ()))
+
+    def hit_ratio(self, entity):
+        hits = self._exist.get((entity, "hit"), 0)
+        total = hits + self._exist.get((entity, "miss"), 0)
+        return hits / total if total else 0.0
+
+    def reset(self):
+        with self._lock:
+            self._latency.clear()
+            self._sum.clear()
+            self._exist.clear()
+
+    def to_prometheus(self):
+        """
+        :return: all metrics in the Prometheus text exposition format
+        """
+        with self._lock:
+            latency = {key: list(counts) for key, counts in self._latency.items()}
+            sums = dict(self._sum)
+            exist = dict(self._exist)
+        name = f"{self.prefix}_call_duration_seconds"
+        lines = [
+            f"# HELP {name} Duration of the db_orm helpers.",
+            f"# TYPE {name} histogram",
+        ]
+        for (operation, entity), counts in sorted(latency.items()):
+            labels = f'operation="{operation}",entity="{entity}"'
+            total = 0
+            for bound, count in zip(self.buckets, counts):
+                total += count
+                lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {total}')
+            total += counts[-1]
+            lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {total}')
+            lines.append(f"{name}_sum{{{labels}}} {sums[(operation, entity)]}")
+            lines.append(f"{name}_count{{{labels}}} {total}")
+        name = f"{self.prefix}_exist_total"
+        lines += [
+            f"# HELP {name} exist() lookups by result.",
+            f"# TYPE {name} counter",
+        ]
+        for (entity, result), count in sorted(exist.items()):
+            lines.append(f'{name}{{entity="{entity}",result="{result}"}} {count}')
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
+
+
+def timed(operation):
+    """
+    Decorator: latency of a helper whose first argument is an ORM class or object
+    """
+    def decorator(function):
+        @wraps(function)
+        def wrapper(entity, *args, **kwargs):
+            if not metrics.enabled:
+                return function(entity, *args, **kwargs)
+            start = perf_counter()
+            try:
+                return function(entity, *args, **kwargs)
+            finally:
+                metrics.observe(operation, entity_name(entity), perf_counter() - start)
+        return wrapper
+    return decorator
+
+
+def entity_name(entity):
+    return entity.__name__ if isinstance(entity, type) else type(entity).__name__
@@ -0,0 +1,201 @@
+import os
+import re
+import sys
+import json
+import hashlib
+import logging
+import argparse
+
+from collections import namedtuple
+
+from sqlalchemy import select
+from sqlalchemy.dialects import postgresql
+
+from db_orm import School, Router, Switch, AP, get_engine, database
+
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+
+"""
+Versioned migrations on top of db_schema.sql.
+migrations/NNNN_name.sql are applied in version order, each in its own transaction,
+and recorded in schema_migrations with a checksum of the file; a changed applied
+file is reported, never re-run. An advisory lock keeps concurrent runners apart.
+check_plans() is the EXPLAIN regression check of the hot queries of db_orm:
+run with sequential scans disabled, any Seq Scan left in a plan means
+there is no index the query can use.
+
+    python db_migrate.py status
+    python db_migrate.py upgrade
+    python db_migrate.py check
+"""
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "migrations")
+MIGRATION_RE = re.compile(r"^(\d+)_(\w+)\.sql$")
+LOCK_ID = 7_351_002  # pg_advisory_xact_lock key of the migration runner
+
+VERSION_TABLE = """
+CREATE TABLE IF NOT EXISTS "schema_migrations"(
+    "version" INTEGER PRIMARY KEY,
+    "name" VARCHAR(255) NOT NULL,
+    "checksum" VARCHAR(64) NOT NULL,
+    "applied" TIMESTAMP DEFAULT CURRENT_TIMESTAMP NOT NULL
+)
+"""
+
+Migration = namedtuple("Migration", "version name path checksum")
+
+
+def migrations(directory=MIGRATIONS_DIR):
+    """
+    :return: list of Migration found in the directory, by version
+    """
+    found = []
+    for file_name in os.listdir(directory):
+        match = MIGRATION_RE.match(file_name)
+        if not match:
+            continue
+        path = os.path.join(directory, file_name)
+        with open(path, "rb") as file:
+            checksum = hashlib.sha256(file.read()).hexdigest()
+        found.append(Migration(int(match.group(1)), match.group(2), path, checksum))
+    found.sort()
+    versions = [migration.version for migration in found]
+    if len(versions) != len(set(versions)):
+        raise ValueError(f"Duplicate migration versions in {directory}: {versions}")
+    return found
+
+
+def applied(connection):
+    """
+    :return: dict version -> checksum of the applied migrations
+    """
+    connection.exec_driver_sql(VERSION_TABLE)
+    return dict(connection.exec_driver_sql('SELECT "version", "checksum" FROM "schema_migrations"').all())
+
+
+def status(engine=None, directory=MIGRATIONS_DIR):
+    """
+    :return: list of (Migration, "applied" | "pending" | "changed")
+    """
+    with (engine or get_engine()).begin() as connection:
+        done = applied(connection)
+    return [
+        (migration, "pending" if migration.version not in done
+         else "applied" if done[migration.version] == migration.checksum else "changed")
+        for migration in migrations(directory)
+    ]
+
+
+def upgrade(engine=None, target=None, directory=MIGRATIONS_DIR):
+    """
+    Applies the pending migrations
+    :param engine: engine of the database, db_orm engine if None
+    :param target: last version to apply, all if None
+    :return: list of applied Migration
+    """
+    engine = engine or get_engine()
+    done = []
+    for migration in migrations(directory):
+        if target is not None and migration.version > target:
+            break
+        with engine.begin() as connection:
+            connection.exec_driver_sql(f"SELECT pg_advisory_xact_lock({LOCK_ID})")
+            versions = applied(connection)
+            if migration.version in versions:
+                if versions[migration.version] != migration.checksum:
+                    logger.warning(f"Migration {migration.version} {migration.name} changed after it was applied")
+                continue
+            logger.info(f"Applying migration {migration.version} {migration.name}")
+            with open(migration.path) as file:
+                connection.execution_options(no_parameters=True).exec_driver_sql(file.read())
+            connection.exec_driver_sql(
+                'INSERT INTO "schema_migrations" ("version", "name", "checksum") VALUES (%(version)s, %(name)s, %(checksum)s)',
+                dict(version=migration.version, name=migration.name, checksum=migration.checksum),
+            )
+        done.append(migration)
+    return done
+
+
+def hot_queries():
+    """
+    Queries db_orm runs per object: every one-to-many lazy load (School.switches, Model.switch...)
+    and the exist() lookups of the import scripts
+    :return: dict name -> select()
+    """
+    queries = {}
+    for mapper in database.registry.mappers:
+        for relation in mapper.relationships:
+            if relation.direction.name != "ONETOMANY" or relation.secondary is not None:
+                continue
+            remote = [remote for _, remote in relation.local_remote_pairs]
+            statement = select(relation.mapper.class_)
+            for column in remote:
+                statement = statement.where(column == 1)
+            queries[f"{mapper.class_.__name__}.{relation.key}"] = statement
+    for entity, column, value in (
+        (School, School.name, "school"),
+        (Router, Router.sn, "SN"),
+        (Router, Router.ip, "10.0.0.1"),
+        (Switch, Switch.name, "switch"),
+        (Switch, Switch.sn, "SN"),
+        (Switch, Switch.ip, "10.0.0.1"),
+        (AP, AP.name, "ap"),
+        (AP, AP.mac, "00:00:00:00:00:01"),
+        (AP, AP.sn, "SN"),
+    ):
+        queries[f"exist({entity.__name__}, {column.key}=...)"] = select(entity).where(column == value).limit(1)
+    return queries
+
+
+def check_plans(engine=None, queries=None):
+    """
+    EXPLAIN of the hot queries with enable_seqscan off
+    :param engine: engine of the database, db_orm engine if None
+    :param queries: dict name -> select(), hot_queries() if None
+    :return: dict name -> tables still read with a sequential scan, empty if every query uses an index
+    """
+    queries = queries or hot_queries()
+    dialect = postgresql.dialect()
+    failures = {}
+    with (engine or get_engine()).connect() as connection:
+        with connection.begin() as transaction:
+            connection.exec_driver_sql("SET LOCAL enable_seqscan = off")
+            for name, statement in queries.items():
+                sql = str(statement.compile(dialect=dialect, compile_kwargs={"literal_binds": True}))
+                plan = connection.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {sql}").scalar()
+                if isinstance(plan, str):
+                    plan = json.loads(plan)
+                tables = sorted(_seq_scans(plan[0]["Plan"]))
+                if tables:
+                    failures[name] = tables
+                    logger.error(f"Sequential scan of {tables} in {name}: {sql}")
+            transaction.rollback()
+    return failures
+
+
+def _seq_scans(node):
+    tables = {node["Relation Name"]} if node.get("Node Type") == "Seq Scan" else set()
+    for child in node.get("Plans", ()):
+        tables |= _seq_scans(child)
+    return tables
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Versioned schema migrations")
+    parser.add_argument("command", choices=("status", "upgrade", "check"))
+    parser.add_argument("--target", type=int, help="last version to apply")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    if args.command == "status":
+        for migration, state in status():
+            print(f"{migration.version:04d} {migration.name:<40} {state}")
+    elif args.command == "upgrade":
+        for migration in upgrade(target=args.target):
+            print(f"{migration.version:04d} {migration.name} applied")
+    else:
+        failures = check_plans()
+        for name, tables in failures.items():
+            print(f"SEQ SCAN {name}: {', '.join(tables)}")
+        sys.exit(1 if failures else 0)
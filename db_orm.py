@@ -1,24 +1,139 @@
 import os
 import logging
+import threading
+
+from time import monotonic
+from functools import lru_cache
+from contextlib import contextmanager
+from collections import OrderedDict, namedtuple
 
 from datetime import datetime
-from ipaddress import ip_network, ip_address
+from string import hexdigits
+from ipaddress import ip_network, ip_address, ip_interface
 
 from sqlalchemy.exc import SQLAlchemyError
-from sqlalchemy.orm import Session, relationship
+from sqlalchemy.orm import relationship, sessionmaker, scoped_session, object_session, Session
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.dialects.postgresql import INET, CIDR, MACADDR
+from sqlalchemy.dialects.postgresql import INET, CIDR, MACADDR, insert
 from sqlalchemy import create_engine, Column, Integer, String, DateTime, ForeignKey, Boolean, UniqueConstraint
+from sqlalchemy import select, tuple_, func, event, inspect, bindparam
+
+from db_metrics import metrics, timed
 
 
 logger = logging.getLogger(__name__)
 logger.addHandler(logging.NullHandler())
 
 
+"""
+Engine and session are created on first use, not at import:
+short scripts that only need the models don't pay for create_engine()
+and `db_engine` / `db_session` stay available as module attributes.
+`db_session` is a scoped session, every thread gets its own Session
+and its own pooled connection, so the CRUD helpers are safe in threaded workers.
+Pool settings come from the environment or from configure().
+"""
 db_url = os.environ.get("NEW_SCHOOL_DATABASE")
-db_engine = create_engine(db_url)
-database = declarative_base(db_engine)
-db_session = Session(bind=db_engine)
+db_engine_options = {
+    "pool_size": int(os.environ.get("NEW_SCHOOL_DB_POOL_SIZE", 5)),
+    "max_overflow": int(os.environ.get("NEW_SCHOOL_DB_MAX_OVERFLOW", 10)),
+    "pool_pre_ping": os.environ.get("NEW_SCHOOL_DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes"),
+    "pool_recycle": int(os.environ.get("NEW_SCHOOL_DB_POOL_RECYCLE", 3600)),
+}
+database = declarative_base()
+_db_engine = None
+_db_session_factory = None
+_db_session = None
+_db_scopefunc = None
+_db_lock = threading.RLock()  # guards the lazy globals, get_session() -> get_session_factory() -> get_engine() nest
+
+
+def configure(url=None, scopefunc=None, **engine_options):
+    """
+    Changes connection settings, must be called before the first query,
+    an already created engine is disposed.
+    :param url: database URL, NEW_SCHOOL_DATABASE if None
+    :param scopefunc: function returning the current scope of `db_session`,
+                      for example current asyncio task, thread if None
+    :param engine_options: create_engine() options: pool_size, max_overflow, pool_pre_ping, pool_recycle...
+    """
+    global db_url, _db_engine, _db_session_factory, _db_session, _db_scopefunc
+    with _db_lock:
+        if url:
+            db_url = url
+        db_engine_options.update(engine_options)
+        _db_scopefunc = scopefunc
+        if _db_session is not None:
+            _db_session.remove()
+        if _db_engine is not None:
+            _db_engine.dispose()
+        _db_engine = _db_session_factory = _db_session = None
+
+
+def get_engine():
+    """
+    :return: engine to NEW_SCHOOL_DATABASE, created on first call
+    """
+    global _db_engine
+    if _db_engine is None:
+        with _db_lock:
+            if _db_engine is None:
+                _db_engine = create_engine(db_url, **db_engine_options)
+    return _db_engine
+
+
+def get_session_factory():
+    """
+    :return: 'sqlalchemy.orm.sessionmaker' bound to the engine, for independent sessions
+    """
+    global _db_session_factory
+    if _db_session_factory is None:
+        with _db_lock:
+            if _db_session_factory is None:
+                _db_session_factory = sessionmaker(bind=get_engine())
+    return _db_session_factory
+
+
+def get_session():
+    """
+    :return: default session 'sqlalchemy.orm.scoping.scoped_session', one Session per thread (or scope)
+    """
+    global _db_session
+    if _db_session is None:
+        with _db_lock:
+            if _db_session is None:
+                _db_session = scoped_session(get_session_factory(), scopefunc=_db_scopefunc)
+    return _db_session
+
+
+@contextmanager
+def session_scope(commit=True):
+    """
+    Transactional scope: new Session, commit on success, rollback on error, closed at exit
+        with session_scope() as session:
+            exist_or_create(Vendor, session, name="Cisco")
+    :param commit: commit at exit if True, else the caller must commit inside the block,
+                   whatever is left uncommitted at exit is discarded when the session closes
+    :return: 'sqlalchemy.orm.session.Session'
+    """
+    session = get_session_factory()()
+    try:
+        yield session
+        if commit:
+            session.commit()
+    except BaseException:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+
+def __getattr__(name):
+    if name == "db_engine":
+        return get_engine()
+    if name == "db_session":
+        return get_session()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 class School(database):
@@ -100,22 +215,24 @@ class Router(database):
         return f"Router(name='{self.name}', ip='{self.ip}')"
 
     def netmiko_params(self):
+        creds = credentials_cache.get(self.model_id, object_session(self))
         return netmiko_params(
-            self.model.creds.netmiko_device,
+            creds.netmiko_device,
             self.ip,
-            self.model.creds.username,
-            self.model.creds.password,
-            self.model.creds.enable_pass,
+            creds.username,
+            creds.password,
+            creds.enable_pass,
         )
 
     def scrapli_params(self):
+        creds = credentials_cache.get(self.model_id, object_session(self))
         return scrapli_params(
-            self.model.creds.scrapli_driver,
-            self.model.creds.scrapli_transport,
+            creds.scrapli_driver,
+            creds.scrapli_transport,
             self.ip,
-            self.model.creds.username,
-            self.model.creds.password,
-            self.model.creds.enable_pass,
+            creds.username,
+            creds.password,
+            creds.enable_pass,
         )
 
 
@@ -177,22 +294,24 @@ class Switch(database):
     model = relationship("Model", back_populates="switch")
 
     def netmiko_params(self):
+        creds = credentials_cache.get(self.model_id, object_session(self))
         return netmiko_params(
-            self.model.creds.netmiko_device,
+            creds.netmiko_device,
             self.ip,
-            self.model.creds.username,
-            self.model.creds.password,
-            self.model.creds.enable_pass,
+            creds.username,
+            creds.password,
+            creds.enable_pass,
         )
 
     def scrapli_params(self):
+        creds = credentials_cache.get(self.model_id, object_session(self))
         return scrapli_params(
-            self.model.creds.scrapli_driver,
-            self.model.creds.scrapli_transport,
+            creds.scrapli_driver,
+            creds.scrapli_transport,
             self.ip,
-            self.model.creds.username,
-            self.model.creds.password,
-            self.model.creds.enable_pass,
+            creds.username,
+            creds.password,
+            creds.enable_pass,
         )
 
 
@@ -501,22 +620,24 @@ class AP(database):
         return f"AP(name='{self.name}', mac='{self.mac}')"
 
     def netmiko_params(self):
+        creds = credentials_cache.get(self.model_id, object_session(self))
         return netmiko_params(
-            self.model.creds.netmiko_device,
+            creds.netmiko_device,
             self.ip,
-            self.model.creds.username,
-            self.model.creds.password,
-            self.model.creds.enable_pass,
+            creds.username,
+            creds.password,
+            creds.enable_pass,
         )
 
     def scrapli_params(self):
+        creds = credentials_cache.get(self.model_id, object_session(self))
         return scrapli_params(
-            self.model.creds.scrapli_driver,
-            self.model.creds.scrapli_transport,
+            creds.scrapli_driver,
+            creds.scrapli_transport,
             self.ip,
-            self.model.creds.username,
-            self.model.creds.password,
-            self.model.creds.enable_pass,
+            creds.username,
+            creds.password,
+            creds.enable_pass,
         )
 
 
@@ -608,50 +729,334 @@ class Credentials(database):
                 )
 
 
-def create(entity, session=db_session, commit=False, **kwargs):
+"""
+Credentials rows almost never change, *_params() of the devices read them
+from this in-process cache keyed by Model.id instead of model -> creds lazy loads.
+"""
+CachedCredentials = namedtuple(
+    "CachedCredentials",
+    "username password enable_pass netmiko_device scrapli_driver scrapli_transport updated",
+)
+
+
+class CredentialsCache:
+    """
+    Credentials by Model.id with TTL and LRU eviction.
+    An expired entry is reloaded from the database, so a change of credentials
+    is seen after `ttl` seconds at the latest; every `check_interval` seconds get() runs
+    refresh(), which drops at once all the entries whose credentials.updated advanced.
+    Secrets are not kept longer than `ttl`.
+    """
+    def __init__(self, maxsize=256, ttl=300, check_interval=30):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.check_interval = check_interval
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # model_id -> (CachedCredentials, loaded at)
+        self._checked = monotonic()
+        self._lock = threading.Lock()
+
+    def get(self, model_id, session=None):
+        """
+        :param model_id: Model.id
+        :param session: SQLAlchemy sesion used on miss, default session if None
+        :return: CachedCredentials or None if the model has no credentials
+        """
+        now = monotonic()
+        with self._lock:
+            check = now - self._checked >= self.check_interval
+            if check:
+                self._checked = now
+        if check:
+            self.refresh(session)
+        with self._lock:
+            entry = self._entries.get(model_id)
+            if entry and now - entry[1] < self.ttl:
+                self._entries.move_to_end(model_id)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+        session = session or get_session()
+        row = session.execute(
+            select(*(getattr(Credentials, field) for field in CachedCredentials._fields))
+            .join(Model, Model.credentials_id == Credentials.id)
+            .where(Model.id == model_id)
+        ).first()
+        creds = CachedCredentials(*row) if row else None
+        with self._lock:
+            self._entries[model_id] = (creds, now)
+            self._entries.move_to_end(model_id)
+            for expired in [key for key, (_, loaded) in self._entries.items() if now - loaded >= self.ttl]:
+                del self._entries[expired]
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return creds
+
+    def refresh(self, session=None):
+        """
+        Drops the entries whose credentials were updated since they were loaded, one query
+        :param session: SQLAlchemy sesion to database, default session if None
+        :return: number of dropped entries
+        """
+        with self._lock:
+            cached = {key: entry[0] for key, entry in self._entries.items()}
+        if not cached:
+            return 0
+        session = session or get_session()
+        current = dict(session.execute(
+            select(Model.id, Credentials.updated)
+            .outerjoin(Credentials, Model.credentials_id == Credentials.id)
+            .where(Model.id.in_(list(cached)))
+        ).all())
+        stale = [key for key, creds in cached.items()
+                 if key not in current or (creds.updated if creds else None) != current[key]]
+        with self._lock:
+            for key in stale:
+                self._entries.pop(key, None)
+        return len(stale)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """
+        :return: dict with hits, misses, hit ratio and size
+        """
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / total if total else 0.0,
+            "size": len(self._entries),
+        }
+
+
+credentials_cache = CredentialsCache(
+    maxsize=int(os.environ.get("NEW_SCHOOL_CREDENTIALS_CACHE_SIZE", 256)),
+    ttl=float(os.environ.get("NEW_SCHOOL_CREDENTIALS_CACHE_TTL", 300)),
+    check_interval=float(os.environ.get("NEW_SCHOOL_CREDENTIALS_CACHE_CHECK_INTERVAL", 30)),
+)
+
+
+"""
+Natural keys of the tables, the unique constraints from db_schema.sql
+that identify a row for the bulk helpers.
+"""
+NATURAL_KEYS = {
+    School: ("name",),  # school_name_unique
+    Router: ("name", "sn", "ip"),  # router_name_sn_ip_unique
+    Vendor: ("name",),  # vendor_name_unique
+    Switch: ("sn",),  # switch_sn_unique
+    Model: ("name",),  # model_name_unique
+    District: ("name",),  # district_name_unique
+    KMSNet: ("school_id", "network"),  # kms_net_school_id_network_unique
+    UsersNet: ("school_id", "network"),  # users_net_school_id_network_unique
+    RTNet: ("school_id", "network"),  # rt_net_school_id_network_unique
+    MGTSNet: ("school_id", "network"),  # mgts_school_id_network_unique
+    WLC: ("name",),  # wlc_name_unique
+    Prime: ("name",),  # prime_name_unique
+    AP: ("mac",),  # ap_mac_unique
+    Project: ("name",),  # project_name_unique
+    SchNet: ("school_id", "network"),  # sch_net_school_id_network_unique
+}
+
+
+"""
+Small dimension tables looked up by name once per imported device row.
+The whole table is loaded into memory on first use: exist() and exist_or_create()
+with exactly the natural key of these tables (name=...) find the id without a query.
+A miss falls back to the query, so new and uncommitted rows are always found.
+The table is reloaded after a commit of this process that wrote to it
+and, checked every `check_interval` seconds, when its row count or max(updated) changed.
+"""
+REFERENCE_ENTITIES = (Vendor, Model, District, Project, WLC, Prime)
+
+
+class ReferenceCache:
+    def __init__(self, check_interval=60, enabled=True):
+        self.check_interval = check_interval
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self._tables = {}  # entity -> ({natural key: id}, version, checked at)
+        self._lock = threading.Lock()
+
+    def covers(self, entity, kwargs):
+        """
+        :return: True if a lookup of `entity` by `kwargs` can be served by the cache
+        """
+        return self.enabled and entity in REFERENCE_ENTITIES and set(kwargs) == set(NATURAL_KEYS[entity])
+
+    def get_id(self, entity, session=None, **kwargs):
+        """
+        :param entity: one of REFERENCE_ENTITIES
+        :param session: SQLAlchemy sesion used to (re)load the table, default session if None
+        :param kwargs: natural key, for example name="Cisco"
+        :return: id or None if not in the cache
+        """
+        try:
+            key = _natural_key(entity, kwargs)
+        except (KeyError, ValueError):
+            return None
+        entity_id = self._ids(entity, session).get(key)
+        with self._lock:
+            if entity_id is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return entity_id
+
+    def get(self, entity, session=None, **kwargs):
+        """
+        Cached object, from the identity map of the session when it was already returned there
+        :return: object or None if not in the cache
+        """
+        session = session or get_session()
+        entity_id = self.get_id(entity, session, **kwargs)
+        if entity_id is None:
+            return None
+        objects = session.info.setdefault("reference_cache", {})
+        obj = objects.get((entity, entity_id))
+        if obj is None or object_session(obj) is not session:
+            obj = session.get(entity, entity_id)
+        loaded = inspect(obj).dict if obj is not None else {}
+        if obj is None or any(name in loaded and loaded[name] != kwargs[name] for name in kwargs):
+            logger.debug("Reference cache: %s(id=%s) was changed, reloading", entity.__name__, entity_id)
+            self.invalidate(entity)
+            return None
+        objects[(entity, entity_id)] = obj
+        return obj
+
+    def invalidate(self, entity=None):
+        """
+        :param entity: table to reload on next use, all tables if None
+        """
+        with self._lock:
+            if entity is None:
+                self._tables.clear()
+            else:
+                self._tables.pop(entity, None)
+
+    def clear(self):
+        self.invalidate()
+
+    def stats(self):
+        """
+        :return: dict with hits, misses, hit ratio and cached rows per table
+        """
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / total if total else 0.0,
+            "tables": {entity.__tablename__: len(table[0]) for entity, table in self._tables.items()},
+        }
+
+    def _ids(self, entity, session):
+        now = monotonic()
+        with self._lock:
+            table = self._tables.get(entity)
+        if table and now - table[2] < self.check_interval:
+            return table[0]
+        session = session or get_session()
+        version = tuple(session.execute(
+            select(func.count(), func.max(func.coalesce(entity.updated, entity.created)))
+        ).one())
+        if table and table[1] == version:
+            ids = table[0]
+        else:
+            key_columns = [getattr(entity, name) for name in NATURAL_KEYS[entity]]
+            ids = {
+                _natural_key(entity, row._mapping): row.id
+                for row in session.execute(select(entity.id, *key_columns))
+            }
+            logger.debug("Reference cache: loaded %s rows of %s", len(ids), entity.__tablename__)
+        with self._lock:
+            self._tables[entity] = (ids, version, now)
+        return ids
+
+
+reference_cache = ReferenceCache(
+    check_interval=float(os.environ.get("NEW_SCHOOL_REFERENCE_CACHE_CHECK", 60)),
+    enabled=os.environ.get("NEW_SCHOOL_REFERENCE_CACHE", "true").lower() in ("1", "true", "yes"),
+)
+
+
+@event.listens_for(Session, "after_flush")
+def _reference_written(session, flush_context):
+    written = session.info.setdefault("reference_written", set())
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, REFERENCE_ENTITIES):
+            written.add(type(obj))
+
+
+@event.listens_for(Session, "after_commit")
+def _reference_committed(session):
+    for entity in session.info.pop("reference_written", ()):
+        reference_cache.invalidate(entity)
+
+
+@event.listens_for(Session, "after_rollback")
+def _reference_rolled_back(session):
+    session.info.pop("reference_written", None)
+    session.info.pop("reference_cache", None)
+
+
+@timed("create")
+def create(entity, session=None, commit=False, **kwargs):
     """
     Creates a new object of the specified type, with the specified parameters
     :param entity: SQLAlchemy ORM object
-    :param session: SQLAlchemy sesion to database 'sqlalchemy.orm.session.Session'
+    :param session: SQLAlchemy sesion to database 'sqlalchemy.orm.session.Session', default session if None
     :param commit: Write to database if True, else need commit() outside.
     :return: Newly created object
     """
-    logger.debug(f"Trying create new object {entity}, with parametrs {kwargs}")
+    session = session or get_session()
+    logger.debug("Trying create new object %s, with parametrs %s", entity, kwargs)
     try:
         new_entity = entity(**kwargs)
         session.add(new_entity)
         if commit:
             session.commit()
-        logger.debug(f"Successful create new object {entity}, with parametrs {kwargs}")
+        logger.debug("Successful create new object %s, with parametrs %s", entity, kwargs)
         return new_entity
     except SQLAlchemyError as error:
         logger.error(error)
 
 
-def exist(entity, session=db_session, **kwargs):
+@timed("exist")
+def exist(entity, session=None, **kwargs):
     """
-    Searches for already existing objects with the given parameters
+    Searches for already existing objects with the given parameters,
+    lookups of reference tables by name are served by reference_cache
     :param entity: SQLAlchemy ORM object
-    :param session: SQLAlchemy sesion to database 'sqlalchemy.orm.session.Session'
+    :param session: SQLAlchemy sesion to database 'sqlalchemy.orm.session.Session', default session if None
     :return: existing object or None
     """
-    logger.debug(f"Check for exist {entity=}, {kwargs=}")
-    exist_entity = session.query(entity).filter_by(**kwargs).first()
+    session = session or get_session()
+    logger.debug("Check for exist entity=%s, kwargs=%s", entity, kwargs)
+    exist_entity = reference_cache.get(entity, session, **kwargs) if reference_cache.covers(entity, kwargs) else None
+    if exist_entity is None:
+        exist_entity = session.query(entity).filter_by(**kwargs).first()
+    metrics.exist_result(entity.__name__, exist_entity is not None)
     if exist_entity:
-        logger.debug(f"Already exists {entity}(id={exist_entity.id}, "
-                     f"params={exist_entity.__dict__})")
+        logger.debug("Already exists %s(id=%s, params=%s)", entity, exist_entity.id, exist_entity.__dict__)
         return exist_entity
     else:
-        logger.debug(f"{entity}({kwargs}) not exist.")
+        logger.debug("%s(%s) not exist.", entity, kwargs)
 
 
-def exist_or_create(entity, session=db_session, commit=False, **kwargs):
+@timed("exist_or_create")
+def exist_or_create(entity, session=None, commit=False, **kwargs):
     """
     :param entity: SQLAlchemy ORM object
-    :param session: SQLAlchemy sesion to database 'sqlalchemy.orm.session.Session'
+    :param session: SQLAlchemy sesion to database 'sqlalchemy.orm.session.Session', default session if None
     :param commit: Write to database if True, else need commit() outside.
     :return: Newly or existing object
     """
+    session = session or get_session()
     exist_entity = exist(entity, session, **kwargs)
     if exist_entity:
         return exist_entity
@@ -660,25 +1065,224 @@ def exist_or_create(entity, session=db_session, commit=False, **kwargs):
         return new_entity
 
 
-def update(entity, session=db_session, commit=False, **kwargs):
+@timed("bulk_exist_or_create")
+def bulk_exist_or_create(entity, rows, session=None, commit=False, return_ids=False, chunk_size=1000):
+    """
+    Set-based exist_or_create() for many rows of one type.
+    Rows are written with INSERT ... ON CONFLICT DO NOTHING, rows that already
+    existed are looked up by the natural key of the table (NATURAL_KEYS),
+    so every chunk costs two statements instead of two per row.
+    :param entity: SQLAlchemy ORM object, one of NATURAL_KEYS
+    :param rows: list of kwargs dicts with column values, as for exist_or_create()
+    :param session: SQLAlchemy sesion to database 'sqlalchemy.orm.session.Session', default session if None
+    :param commit: Write to database if True, else need commit() outside.
+    :param return_ids: return primary keys instead of objects
+    :param chunk_size: rows per INSERT statement
+    :return: objects (or ids) in input order, None for the rows that were rejected
+    :raise SQLAlchemyError: a statement failed, the session is rolled back
+    """
+    session = session or get_session()
+    if entity not in NATURAL_KEYS:
+        raise ValueError(f"{entity} has no natural key for bulk upsert")
+    table = entity.__table__
+    key_columns = [table.c[name] for name in NATURAL_KEYS[entity]]
+
+    keys = []
+    for values in rows:
+        try:
+            keys.append(_natural_key(entity, values))
+        except (KeyError, ValueError) as error:
+            logger.error(f"Bulk upsert {entity}, incorrect row {values}: {error!r}")
+            keys.append(None)
+
+    pending = {}
+    for key, values in zip(keys, rows):
+        if key is not None and key not in pending:
+            pending[key] = values
+    pending = list(pending.items())
+
+    ids = {}
+    try:
+        for start in range(0, len(pending), chunk_size):
+            chunk = pending[start:start + chunk_size]
+            for group in _same_columns(values for _, values in chunk):
+                statement = insert(table).values(group).on_conflict_do_nothing()
+                result = session.execute(statement.returning(table.c.id, *key_columns))
+                for row in result:
+                    ids[_natural_key(entity, row._mapping)] = row.id
+            existing = [key for key, _ in chunk if key not in ids]
+            if existing:
+                result = session.execute(
+                    select(table.c.id, *key_columns).where(tuple_(*key_columns).in_(existing))
+                )
+                for row in result:
+                    ids[_natural_key(entity, row._mapping)] = row.id
+        if commit:
+            session.commit()
+    except SQLAlchemyError as error:
+        logger.error(f"Bulk upsert {entity} failed, transaction rolled back: {error}")
+        session.rollback()
+        raise
+
+    result_ids = [ids.get(key) if key is not None else None for key in keys]
+    for key, values in pending:
+        if key not in ids:
+            logger.error(f"Bulk upsert {entity}, row {values} conflicts with another unique constraint")
+    if return_ids:
+        return result_ids
+
+    objects = {}
+    found = list(set(filter(None, result_ids)))
+    for start in range(0, len(found), chunk_size):
+        for obj in session.query(entity).filter(entity.id.in_(found[start:start + chunk_size])):
+            objects[obj.id] = obj
+    return [objects.get(entity_id) for entity_id in result_ids]
+
+
+def _natural_key(entity, values, names=None):
+    """
+    Natural key of a row, normalized so that input values and values returned
+    by PostgreSQL compare equal ('10.1.1.1' == '10.1.1.1/32', 'AA-BB-..' == 'aa:bb:..')
+    :param entity: SQLAlchemy ORM object, one of NATURAL_KEYS
+    :param values: mapping column name -> value
+    :param names: key columns, NATURAL_KEYS of the entity if None
+    :return: tuple of normalized values
+    """
+    return tuple(_normalized(entity.__table__.c[name].type, values[name]) for name in names or NATURAL_KEYS[entity])
+
+
+def _normalized(column_type, value):
+    if value is None:
+        return None
+    if isinstance(column_type, CIDR):
+        return str(ip_network(str(value).strip(), strict=False))
+    if isinstance(column_type, INET):
+        return str(ip_interface(str(value).strip()))
+    if isinstance(column_type, MACADDR):
+        mac = "".join(char for char in str(value).lower() if char in hexdigits)
+        if len(mac) != 12:
+            raise ValueError(f"Incorrect mac address: {value}")
+        return mac
+    return value
+
+
+def _same_columns(rows):
+    """
+    Groups rows by their set of columns, multi-row INSERT needs the same keys in every row
+    :param rows: iterable of kwargs dicts
+    :return: lists of dicts with the same keys
+    """
+    groups = {}
+    for values in rows:
+        groups.setdefault(frozenset(values), []).append(values)
+    return list(groups.values())
+
+
+@timed("update")
+def update(entity, session=None, commit=False, **kwargs):
     """
     Updates the attributes of an existing object
     :param entity: SQLAlchemy ORM object
-    :param session: SQLAlchemy sesion to database 'sqlalchemy.orm.session.Session'
+    :param session: SQLAlchemy sesion to database 'sqlalchemy.orm.session.Session', default session if None
     :param commit: Write to database if True, else need commit() outside.
     :return: Updated object
     """
+    session = session or get_session()
     for attr, value in kwargs.items():
         try:
-            logger.debug(f"Update: {entity=}, {attr=}, {value=}")
+            logger.debug("Update: entity=%r, attr=%r, value=%r", entity, attr, value)
             setattr(entity, attr, value)
         except AttributeError as error:
-            logger.error(f"Error update {attr=}, {value=}, {error=}")
+            logger.error("Error update attr=%r, value=%r, error=%r", attr, value, error)
     if commit:
         session.commit()
     return entity
 
 
+"""
+Result of bulk_update(): rows found, rows written, rows already up to date,
+input rows without a match in the table, and rows written per column.
+"""
+UpdateSummary = namedtuple("UpdateSummary", "matched changed unchanged missing columns")
+
+
+@timed("bulk_update")
+def bulk_update(entity, rows, session=None, commit=False, key=("id",), chunk_size=1000):
+    """
+    Change-aware update() for many rows of one type.
+    The current values of the given columns are read in one statement per chunk and compared
+    with the new ones, rows without a difference are not written at all (no UPDATE,
+    no trigger_set_timestamp), changed rows are written with one executemany UPDATE
+    per set of changed columns, only the changed columns are set.
+    :param entity: SQLAlchemy ORM object
+    :param rows: list of dicts with the key columns and the new values, for example dict(sn="FOC123", os_version="17.3")
+    :param session: SQLAlchemy sesion to database 'sqlalchemy.orm.session.Session', default session if None
+    :param commit: Write to database if True, else need commit() outside.
+    :param key: columns identifying the rows: ("id",), NATURAL_KEYS of the entity or another unique key
+    :param chunk_size: rows per SELECT
+    :return: UpdateSummary
+    :raise SQLAlchemyError: a statement failed, the session is rolled back
+    """
+    session = session or get_session()
+    table = entity.__table__
+    key = tuple(key)
+    key_columns = [table.c[name] for name in key]
+    matched = changed = missing = 0
+    columns = {}
+
+    incoming = {}
+    for values in rows:
+        try:
+            incoming[_natural_key(entity, values, key)] = values
+        except (KeyError, ValueError) as error:
+            logger.error(f"Bulk update {entity}, incorrect row {values}: {error!r}")
+            missing += 1
+    incoming = list(incoming.items())
+
+    try:
+        for start in range(0, len(incoming), chunk_size):
+            chunk = dict(incoming[start:start + chunk_size])
+            names = sorted({name for values in chunk.values() for name in values if name not in key})
+            current = {}
+            statement = select(table.c.id, *key_columns, *(table.c[name] for name in names if name != "id"))
+            for row in session.execute(statement.where(tuple_(*key_columns).in_(list(chunk)))):
+                current[_natural_key(entity, row._mapping, key)] = row._mapping
+
+            groups = {}
+            for row_key, values in chunk.items():
+                row = current.get(row_key)
+                if row is None:
+                    missing += 1
+                    continue
+                matched += 1
+                diff = {
+                    name: value for name, value in values.items()
+                    if name not in key and _normalized(table.c[name].type, value)
+                    != _normalized(table.c[name].type, row[name])
+                }
+                if diff:
+                    diff["_id"] = row["id"]
+                    groups.setdefault(frozenset(diff), []).append(diff)
+
+            for names, params in groups.items():
+                statement = table.update().where(table.c.id == bindparam("_id"))
+                statement = statement.values({name: bindparam(name) for name in names if name != "_id"})
+                session.execute(statement, params)
+                changed += len(params)
+                for name in names - {"_id"}:
+                    columns[name] = columns.get(name, 0) + len(params)
+        if commit and changed:
+            session.commit()
+    except SQLAlchemyError as error:
+        logger.error(f"Bulk update {entity} failed, transaction rolled back: {error}")
+        session.rollback()
+        raise
+
+    summary = UpdateSummary(matched, changed, matched - changed, missing, columns)
+    logger.debug("Bulk update %s: %s", entity, summary)
+    return summary
+
+
 def isnet(network: str) -> str:
     """
     Checking if the network prefix is correct
@@ -713,6 +1317,62 @@ def isip(ipaddr: str) -> str:
         logger.error(error)
 
 
+"""
+Batch validation for imports: no logging per value, repeated values are parsed
+once, every rejected value is reported with its row index and the reason.
+"""
+ValidationError = namedtuple("ValidationError", "index value reason")
+
+
+def validate_nets(values) -> tuple:
+    """
+    Batch isnet()
+    :param values: iterable of network prefixes, for example a CSV column
+    :return: (list of normalized prefixes, None for incorrect ones; list of ValidationError)
+    """
+    return _validate(values, _parse_net)
+
+
+def validate_ips(values) -> tuple:
+    """
+    Batch isip()
+    :param values: iterable of ip addresses, for example a CSV column
+    :return: (list of normalized ip addresses, None for incorrect ones; list of ValidationError)
+    """
+    return _validate(values, _parse_ip)
+
+
+def _validate(values, parse):
+    normalized = []
+    errors = []
+    for index, value in enumerate(values):
+        result, reason = parse(value) if isinstance(value, str) else (None, f"not a string: {type(value).__name__}")
+        if reason:
+            errors.append(ValidationError(index, value, reason))
+        normalized.append(result)
+    return normalized, errors
+
+
+@lru_cache(maxsize=65536)
+def _parse_net(value):
+    if not value.strip():
+        return None, "empty value"
+    try:
+        return str(ip_network(value.strip(), strict=False)), None
+    except ValueError as error:
+        return None, str(error)
+
+
+@lru_cache(maxsize=65536)
+def _parse_ip(value):
+    if not value.strip():
+        return None, "empty value"
+    try:
+        return str(ip_address(value.strip())), None
+    except ValueError as error:
+        return None, str(error)
+
+
 def netmiko_params(dev_type: str,
                    addr: str,
                    user: str,
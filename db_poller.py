@@ -0,0 +1,205 @@
+import asyncio
+import logging
+import argparse
+
+from time import monotonic
+from datetime import datetime
+from collections import namedtuple
+
+from sqlalchemy import select
+
+from db_orm import Router, Switch, WLC, Prime, AP
+from db_async import get_async_session_factory
+
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+
+"""
+TCP reachability poller for the `available` columns.
+Every device ip is probed with a TCP connect to the given ports, a device is reachable
+if a port accepts the connection or actively refuses it (the host answered).
+A fixed pool of `concurrency` workers keeps that many probes in flight, a token bucket
+limits new connections per second, every probe has its own timeout.
+`available` is the time the device was last seen reachable: reachable devices are
+written in batches, one UPDATE ... WHERE id IN (...) per table and batch,
+unreachable ones keep their previous value.
+Thousands of concurrent probes need a matching open files limit (ulimit -n).
+
+    python db_poller.py --ports 22 443 --concurrency 5000 --rate 10000
+"""
+DEVICE_TYPES = (Router, Switch, AP, WLC, Prime)
+
+Target = namedtuple("Target", "entity id ip")
+ProbeResult = namedtuple("ProbeResult", "target reachable port seconds error")
+
+
+class RateLimiter:
+    """
+    Token bucket: at most `rate` acquire() per second, bursts up to `burst`
+    """
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.burst = burst or max(1, int(rate / 10))
+        self._tokens = self.burst
+        self._updated = monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+async def probe(target, ports=(22,), timeout=2.0, limiter=None):
+    """
+    :param target: Target, or any object with an `ip` attribute
+    :param ports: TCP ports tried in order until one answers
+    :param timeout: seconds per connection attempt
+    :param limiter: RateLimiter for new connections or None
+    :return: ProbeResult
+    """
+    start = monotonic()
+    error = None
+    for port in ports:
+        if limiter:
+            await limiter.acquire()
+        try:
+            _, writer = await asyncio.wait_for(asyncio.open_connection(target.ip, port), timeout)
+        except ConnectionRefusedError:
+            return ProbeResult(target, True, port, monotonic() - start, "refused")
+        except (OSError, asyncio.TimeoutError) as exc:
+            error = type(exc).__name__
+            continue
+        writer.close()
+        try:
+            await writer.wait_closed()
+        except OSError:
+            pass
+        return ProbeResult(target, True, port, monotonic() - start, None)
+    return ProbeResult(target, False, None, monotonic() - start, error)
+
+
+async def sweep(targets, ports=(22,), timeout=2.0, concurrency=1000, rate=None):
+    """
+    Probes all the targets with at most `concurrency` probes in flight
+    :param targets: iterable of Target (or objects with `ip`), consumed lazily
+    :param rate: maximum new connections per second, unlimited if None
+    :return: async generator of ProbeResult in completion order
+    """
+    limiter = RateLimiter(rate) if rate else None
+    targets = iter(targets)
+    results = asyncio.Queue(maxsize=concurrency * 2)
+    done = object()
+
+    async def worker():
+        try:
+            for target in targets:
+                await results.put(await probe(target, ports, timeout, limiter))
+        except Exception as error:
+            logger.exception(f"Probe worker failed: {error!r}")
+        await results.put(done)
+
+    workers = [asyncio.ensure_future(worker()) for _ in range(concurrency)]
+    try:
+        running = len(workers)
+        while running:
+            result = await results.get()
+            if result is done:
+                running -= 1
+            else:
+                yield result
+    finally:
+        for task in workers:
+            task.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+
+
+class AvailabilityWriter:
+    """
+    Collects reachable devices and sets their `available` in batched UPDATEs
+    """
+    def __init__(self, session, batch_size=5000):
+        """
+        :param session: 'sqlalchemy.ext.asyncio.AsyncSession'
+        :param batch_size: ids per UPDATE
+        """
+        self.session = session
+        self.batch_size = batch_size
+        self.written = 0
+        self._pending = {}  # entity -> ids
+
+    async def add(self, result):
+        if not result.reachable:
+            return
+        ids = self._pending.setdefault(result.target.entity, [])
+        ids.append(result.target.id)
+        if len(ids) >= self.batch_size:
+            await self._write(result.target.entity)
+
+    async def flush(self):
+        for entity in list(self._pending):
+            await self._write(entity)
+
+    async def _write(self, entity):
+        ids = self._pending.pop(entity, [])
+        if not ids:
+            return
+        table = entity.__table__
+        await self.session.execute(table.update().where(table.c.id.in_(ids)).values(available=datetime.now()))
+        await self.session.commit()
+        self.written += len(ids)
+        logger.debug(f"Available: {len(ids)} rows of {table.name}")
+
+
+async def inventory_targets(session, device_types=DEVICE_TYPES):
+    """
+    :param session: 'sqlalchemy.ext.asyncio.AsyncSession'
+    :return: list of Target of all the devices with an ip address
+    """
+    targets = []
+    for entity in device_types:
+        result = await session.execute(select(entity.id, entity.ip).where(entity.ip.isnot(None)).order_by(entity.id))
+        targets.extend(Target(entity, row.id, str(row.ip).split("/")[0]) for row in result)
+    return targets
+
+
+async def poll(ports=(22,), timeout=2.0, concurrency=1000, rate=None, batch_size=5000, device_types=DEVICE_TYPES):
+    """
+    One sweep over the inventory, writes `available` of the reachable devices
+    :return: dict with probed, reachable and seconds
+    """
+    start = monotonic()
+    session_factory = get_async_session_factory()
+    async with session_factory() as session:
+        targets = await inventory_targets(session, device_types)
+    probed = reachable = 0
+    async with session_factory() as session:
+        writer = AvailabilityWriter(session, batch_size)
+        async for result in sweep(targets, ports, timeout, concurrency, rate):
+            probed += 1
+            reachable += result.reachable
+            await writer.add(result)
+        await writer.flush()
+    summary = {"probed": probed, "reachable": reachable, "seconds": monotonic() - start}
+    logger.info(f"Poll: {summary}")
+    return summary
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="TCP reachability poller, fills the available columns")
+    parser.add_argument("--ports", type=int, nargs="+", default=[22])
+    parser.add_argument("--timeout", type=float, default=2.0)
+    parser.add_argument("--concurrency", type=int, default=1000)
+    parser.add_argument("--rate", type=float, help="new connections per second")
+    parser.add_argument("--batch-size", type=int, default=5000)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    print(asyncio.run(poll(args.ports, args.timeout, args.concurrency, args.rate, args.batch_size)))
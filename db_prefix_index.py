@@ -0,0 +1,136 @@
+import logging
+
+from collections import namedtuple
+from ipaddress import ip_address, ip_network
+
+from sqlalchemy import select, func
+
+from db_orm import KMSNet, UsersNet, RTNet, MGTSNet, SchNet, get_session
+
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+
+"""
+In-memory longest-prefix-match index: ip address -> school owning it.
+Prefixes are kept in one hash table per prefix length, a lookup probes
+the lengths present from the longest to the shortest (a handful of dict
+lookups, no per-bit walk as in a trie), so the more specific vlanNN
+sub-prefixes win over the school network they belong to.
+refresh() applies only the rows created or updated since the last load.
+"""
+SOURCES = (
+    (KMSNet, ("network", "vlan30", "vlan60", "vlan70")),
+    (UsersNet, ("network", "vlan40", "vlan50")),
+    (RTNet, ("network",)),
+    (MGTSNet, ("network",)),
+    (SchNet, ("network",)),
+)
+
+PrefixOwner = namedtuple("PrefixOwner", "school_id source column network")
+
+
+class PrefixIndex:
+    def __init__(self):
+        self._prefixes = {4: {}, 6: {}}  # version -> {length: {network int >> host bits: {row key: owner}}}
+        self._lengths = {4: [], 6: []}  # version -> lengths present, longest first
+        self._rows = {}  # (table, id) -> [(version, length, key, row key)]
+        self.watermarks = {}  # table -> max(coalesce(updated, created)) loaded
+
+    def __len__(self):
+        return sum(len(keys) for by_length in self._prefixes.values() for keys in by_length.values())
+
+    def load(self, session=None, yield_per=10000):
+        """
+        Loads all the network tables from scratch
+        :param session: SQLAlchemy sesion to database 'sqlalchemy.orm.session.Session', default session if None
+        :param yield_per: rows fetched from the server cursor at a time
+        :return: self
+        """
+        self.__init__()
+        self.refresh(session, yield_per)
+        return self
+
+    def refresh(self, session=None, yield_per=10000):
+        """
+        Applies the rows created or updated since the previous load/refresh.
+        Deleted rows are not seen, load() again to drop them.
+        :param session: SQLAlchemy sesion to database 'sqlalchemy.orm.session.Session', default session if None
+        :param yield_per: rows fetched from the server cursor at a time
+        :return: number of rows applied
+        """
+        session = session or get_session()
+        applied = 0
+        for entity, columns in SOURCES:
+            table = entity.__tablename__
+            changed = func.coalesce(entity.updated, entity.created)
+            statement = select(entity.id, entity.school_id, changed.label("changed"),
+                               *(getattr(entity, column) for column in columns))
+            since = self.watermarks.get(table)
+            if since is not None:
+                statement = statement.where(changed >= since)
+            result = session.execute(statement.execution_options(stream_results=True))
+            for row in result.yield_per(yield_per):
+                self._remove_row((table, row.id))
+                for column in columns:
+                    if getattr(row, column):
+                        self._add(table, row.id, column, row.school_id, getattr(row, column))
+                if since is None or row.changed > since:
+                    since = row.changed
+                applied += 1
+            if since is not None:
+                self.watermarks[table] = since
+        logger.debug(f"Prefix index refresh: {applied} rows, {len(self)} prefixes")
+        return applied
+
+    def lookup(self, address):
+        """
+        :param address: ip address, str or ipaddress object
+        :return: PrefixOwner of the longest matching prefix, or None
+        """
+        ip = ip_address(address) if isinstance(address, str) else address
+        value = int(ip)
+        bits = ip.max_prefixlen
+        by_length = self._prefixes[ip.version]
+        for length in self._lengths[ip.version]:
+            owners = by_length[length].get(value >> (bits - length))
+            if owners:
+                return next(iter(owners.values()))
+
+    def lookup_many(self, addresses):
+        """
+        Batch lookup, for example all source addresses of a syslog or netflow dump,
+        repeated addresses are resolved once, incorrect ones give None
+        :param addresses: iterable of ip addresses
+        :return: list of PrefixOwner or None, in input order
+        """
+        found = {}
+        owners = []
+        for address in addresses:
+            if address not in found:
+                try:
+                    found[address] = self.lookup(address)
+                except ValueError:
+                    found[address] = None
+            owners.append(found[address])
+        return owners
+
+    def _add(self, table, row_id, column, school_id, network):
+        net = ip_network(str(network), strict=False)
+        length = net.prefixlen
+        key = int(net.network_address) >> (net.max_prefixlen - length)
+        by_length = self._prefixes[net.version]
+        if length not in by_length:
+            by_length[length] = {}
+            self._lengths[net.version] = sorted(by_length, reverse=True)
+        row_key = (table, row_id, column)
+        by_length[length].setdefault(key, {})[row_key] = PrefixOwner(school_id, table, column, str(net))
+        self._rows.setdefault((table, row_id), []).append((net.version, length, key, row_key))
+
+    def _remove_row(self, row):
+        for version, length, key, row_key in self._rows.pop(row, ()):
+            owners = self._prefixes[version][length][key]
+            owners.pop(row_key, None)
+            if not owners:
+                del self._prefixes[version][length][key]
@@ -0,0 +1,162 @@
+import os
+import json
+import logging
+import threading
+import traceback
+
+from time import perf_counter
+from contextlib import contextmanager
+
+from sqlalchemy import event
+
+import db_orm
+import old_db_orm
+
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+
+"""
+Opt-in SQL profiler on engine events: latency, row count and call sites
+of every statement, N+1 detection and a slow-query report.
+A statement executed `n_plus_one` times or more by ORM lazy loads within one
+transaction (unit of work) is reported as N+1, with the call sites that
+triggered it, for example `self.model.creds` in a loop over switches.
+
+    with profile() as profiler:
+        run_job()
+    profiler.write_report("sql_report.json")
+    assert not profiler.n_plus_one_findings()
+"""
+SKIP_FRAMES = (os.sep + "sqlalchemy" + os.sep, __file__)
+LAZY_LOAD_FRAME = os.path.join("sqlalchemy", "orm", "strategies.py")
+
+
+class QueryProfiler:
+    def __init__(self, slow_ms=100, n_plus_one=5):
+        """
+        :param slow_ms: statements slower than this are kept in the slow-query log
+        :param n_plus_one: repeated lazy loads of one statement in one transaction to report
+        """
+        self.slow_ms = slow_ms
+        self.n_plus_one = n_plus_one
+        self.statements = {}  # statement -> stats dict
+        self.slow = []  # (ms, statement, parameters, call site)
+        self.findings = {}  # statement -> N+1 finding
+        self._engines = []
+        self._lock = threading.Lock()
+
+    def attach(self, engine):
+        event.listen(engine, "before_cursor_execute", self._before)
+        event.listen(engine, "after_cursor_execute", self._after)
+        event.listen(engine, "commit", self._end_unit)
+        event.listen(engine, "rollback", self._end_unit)
+        self._engines.append(engine)
+        return self
+
+    def detach(self):
+        for engine in self._engines:
+            event.remove(engine, "before_cursor_execute", self._before)
+            event.remove(engine, "after_cursor_execute", self._after)
+            event.remove(engine, "commit", self._end_unit)
+            event.remove(engine, "rollback", self._end_unit)
+        self._engines = []
+
+    def _before(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("profiler_start", []).append(perf_counter())
+
+    def _after(self, conn, cursor, statement, parameters, context, executemany):
+        elapsed_ms = (perf_counter() - conn.info["profiler_start"].pop()) * 1000
+        call_site, lazy = _call_site()
+        with self._lock:
+            stats = self.statements.get(statement)
+            if stats is None:
+                stats = self.statements[statement] = {
+                    "count": 0, "total_ms": 0.0, "max_ms": 0.0, "rows": 0, "call_sites": {},
+                }
+            stats["count"] += 1
+            stats["total_ms"] += elapsed_ms
+            stats["max_ms"] = max(stats["max_ms"], elapsed_ms)
+            stats["rows"] += max(cursor.rowcount, 0)
+            stats["call_sites"][call_site] = stats["call_sites"].get(call_site, 0) + 1
+            if elapsed_ms >= self.slow_ms:
+                self.slow.append((elapsed_ms, statement, repr(parameters)[:200], call_site))
+        if lazy:
+            unit = conn.info.setdefault("profiler_unit", {})
+            unit[statement] = unit.get(statement, 0) + 1
+            if unit[statement] >= self.n_plus_one:
+                with self._lock:
+                    finding = self.findings.setdefault(statement, {"max_per_unit": 0, "call_sites": set()})
+                    finding["max_per_unit"] = max(finding["max_per_unit"], unit[statement])
+                    finding["call_sites"].add(call_site)
+
+    def _end_unit(self, conn):
+        conn.info.pop("profiler_unit", None)
+
+    def n_plus_one_findings(self):
+        """
+        :return: list of dicts statement, max_per_unit, call_sites
+        """
+        with self._lock:
+            return [
+                {"statement": statement, "max_per_unit": finding["max_per_unit"],
+                 "call_sites": sorted(finding["call_sites"])}
+                for statement, finding in self.findings.items()
+            ]
+
+    def report(self, limit=20):
+        """
+        :param limit: number of statements in the top lists
+        :return: dict with top statements by total time, slow queries and N+1 findings
+        """
+        with self._lock:
+            statements = [dict(stats, statement=statement, call_sites=dict(stats["call_sites"]))
+                          for statement, stats in self.statements.items()]
+            slow = sorted(self.slow, reverse=True)[:limit]
+        statements.sort(key=lambda stats: stats["total_ms"], reverse=True)
+        return {
+            "statements": len(statements),
+            "executions": sum(stats["count"] for stats in statements),
+            "total_ms": sum(stats["total_ms"] for stats in statements),
+            "top": statements[:limit],
+            "slow": [
+                {"ms": ms, "statement": statement, "parameters": parameters, "call_site": call_site}
+                for ms, statement, parameters, call_site in slow
+            ],
+            "n_plus_one": self.n_plus_one_findings(),
+        }
+
+    def write_report(self, path, limit=20):
+        with open(path, "w") as file:
+            json.dump(self.report(limit), file, indent=2, default=str)
+        for finding in self.n_plus_one_findings():
+            logger.warning("N+1: %s x%s from %s", finding["statement"].split("\n")[0],
+                           finding["max_per_unit"], finding["call_sites"])
+
+
+@contextmanager
+def profile(slow_ms=100, n_plus_one=5, old=False):
+    """
+    Profiles db_engine (and old_db_engine if `old`) inside the with block
+    :return: QueryProfiler
+    """
+    profiler = QueryProfiler(slow_ms, n_plus_one).attach(db_orm.get_engine())
+    if old:
+        profiler.attach(old_db_orm.get_old_engine())
+    try:
+        yield profiler
+    finally:
+        profiler.detach()
+
+
+def _call_site():
+    """
+    :return: ("file:line function" of the first frame outside SQLAlchemy, lazy load flag)
+    """
+    stack = traceback.extract_stack()
+    lazy = any(frame.filename.endswith(LAZY_LOAD_FRAME) for frame in stack)
+    for frame in reversed(stack):
+        if not any(skip in frame.filename for skip in SKIP_FRAMES):
+            return f"{frame.filename}:{frame.lineno} {frame.name}", lazy
+    return "unknown", lazy
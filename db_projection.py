@@ -0,0 +1,71 @@
+import logging
+
+from functools import lru_cache
+from collections import namedtuple
+
+from sqlalchemy import select
+
+from db_orm import School, Router, Switch, KMSNet, UsersNet, RTNet, MGTSNet, AP, SchNet, get_session
+
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+
+"""
+Read-only projections: plain immutable tuples with the requested columns,
+read with a column select, no identity map, no instrumented objects.
+For reports over hundreds of thousands of rows:
+
+    for switch in project(Switch, "name", "ip", school_id=42):
+        print(switch.name, switch.ip)
+"""
+READ_COLUMNS = {
+    School: ("id", "name", "short_name", "address", "district_id", "project_id"),
+    Router: ("id", "name", "ip", "sn", "school_id"),
+    Switch: ("id", "name", "ip", "sn", "school_id"),
+    AP: ("id", "name", "ip", "sn", "mac", "school_id"),
+    KMSNet: ("id", "school_id", "network", "vlan30", "vlan60", "vlan70"),
+    UsersNet: ("id", "school_id", "network", "vlan40", "vlan50"),
+    RTNet: ("id", "school_id", "network"),
+    MGTSNet: ("id", "school_id", "network"),
+    SchNet: ("id", "school_id", "network", "description", "kms"),
+}
+
+
+@lru_cache(maxsize=None)
+def record_type(entity, columns):
+    """
+    :return: namedtuple class `<Entity>Record` with the given columns
+    """
+    return namedtuple(f"{entity.__name__}Record", columns)
+
+
+def project(entity, *columns, session=None, yield_per=10000, where=(), **filter_by):
+    """
+    Streams rows of a table as immutable namedtuples
+    :param entity: SQLAlchemy ORM object
+    :param columns: column names, READ_COLUMNS of the entity if empty
+    :param session: SQLAlchemy sesion to database 'sqlalchemy.orm.session.Session', default session if None
+    :param yield_per: rows fetched from the server cursor at a time
+    :param where: additional SQL conditions, for example (Switch.ip.isnot(None),)
+    :param filter_by: column=value filters, as for exist()
+    :return: generator of records
+    """
+    columns = tuple(columns) or READ_COLUMNS[entity]
+    record = record_type(entity, columns)
+    statement = select(*(getattr(entity, column) for column in columns)).filter_by(**filter_by)
+    for condition in where:
+        statement = statement.where(condition)
+    session = session or get_session()
+    result = session.execute(statement.order_by(entity.id).execution_options(stream_results=True))
+    for partition in result.partitions(yield_per):
+        for row in partition:
+            yield record._make(row)
+
+
+def project_all(entity, *columns, session=None, where=(), **filter_by):
+    """
+    :return: list of records, see project()
+    """
+    return list(project(entity, *columns, session=session, where=where, **filter_by))
@@ -0,0 +1,286 @@
+import mmap
+import struct
+import hashlib
+import logging
+import argparse
+
+from collections import namedtuple
+from ipaddress import ip_address
+from string import hexdigits
+
+from sqlalchemy import select, null
+
+from db_orm import School, Router, Switch, Model, WLC, Prime, AP, Credentials, get_session
+from db_orm import netmiko_params, scrapli_params
+
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+
+"""
+Read-only inventory snapshot in one memory-mapped file, for tools without database access.
+Layout: header, fixed-size records (schools, each followed by its devices; WLC and Prime),
+credentials, string pool, and four hash indexes (name, ip, mac, sn) sorted by a 64-bit key hash.
+Opening maps the file and reads the header; a lookup is a binary search with
+struct.unpack_from() on the mapping, only the matching records are decoded.
+Passwords are written only with include_secrets=True.
+
+    python db_snapshot.py build inventory.snap
+    python db_snapshot.py get inventory.snap 10.1.2.3
+"""
+MAGIC = b"SCHSNAP1"
+HEADER = struct.Struct("<8sIQIQQQ" + "QI" * 4)
+RECORD = struct.Struct("<BxxxiIIi" + "II" * 5)  # kind, parent, first child, children, creds, 5 strings
+CREDS = struct.Struct("<" + "II" * 6)
+INDEX = struct.Struct("<QI")  # key hash, record
+
+KINDS = ("school", "router", "switch", "ap", "wlc", "prime")
+INDEXES = ("name", "ip", "mac", "sn")
+CREDS_FIELDS = ("netmiko_device", "scrapli_driver", "scrapli_transport", "username", "password", "enable_pass")
+
+SnapshotRecord = namedtuple("SnapshotRecord", "index kind name ip mac sn address parent first_child children creds")
+SnapshotCredentials = namedtuple("SnapshotCredentials", CREDS_FIELDS)
+
+
+def key_hash(value: str) -> int:
+    return int.from_bytes(hashlib.blake2b(value.encode(), digest_size=8).digest(), "little")
+
+
+def normalize(index, value):
+    """
+    Lookup key of a value: ip addresses without prefix length, mac as 12 hex digits
+    """
+    if value is None:
+        return None
+    value = str(value).strip()
+    if index == "ip":
+        return str(ip_address(value.split("/")[0]))
+    if index == "mac":
+        return "".join(char for char in value.lower() if char in hexdigits)
+    return value
+
+
+def build(path, session=None, include_secrets=False):
+    """
+    Writes the snapshot of the whole inventory
+    :param path: output file
+    :param session: SQLAlchemy sesion to database 'sqlalchemy.orm.session.Session', default session if None
+    :param include_secrets: write passwords and enable secrets
+    :return: number of records
+    """
+    session = session or get_session()
+    strings = bytearray()
+    string_refs = {}
+
+    def ref(value):
+        if value is None:
+            return 0, 0
+        data = str(value).encode()
+        if data not in string_refs:
+            string_refs[data] = len(strings)
+            strings.extend(data)
+        return string_refs[data], len(data)
+
+    creds_rows = session.execute(
+        select(Credentials.id, *(getattr(Credentials, field) for field in CREDS_FIELDS)).order_by(Credentials.id)
+    ).all()
+    creds_index = {row[0]: number for number, row in enumerate(creds_rows)}
+    creds_by_model = dict(session.execute(select(Model.id, Model.credentials_id)).all())
+    creds = bytearray()
+    for row in creds_rows:
+        values = dict(zip(CREDS_FIELDS, row[1:]))
+        if not include_secrets:
+            values["password"] = values["enable_pass"] = None
+        creds += CREDS.pack(*(part for field in CREDS_FIELDS for part in ref(values[field])))
+
+    devices = {}
+    for kind, entity in (("router", Router), ("switch", Switch), ("ap", AP)):
+        mac = entity.mac if hasattr(entity, "mac") else null()
+        sn = entity.sn if hasattr(entity, "sn") else null()
+        statement = select(entity.school_id, entity.name, entity.ip, mac, sn, entity.model_id).order_by(entity.id)
+        for row in session.execute(statement):
+            devices.setdefault(row[0], []).append((kind,) + tuple(row[1:]))
+
+    records = []  # (kind, parent, first child, children, creds, name, ip, mac, sn, address)
+    for school in session.execute(select(School.id, School.name, School.address).order_by(School.id)):
+        children = devices.pop(school.id, [])
+        parent = len(records)
+        records.append((0, -1, parent + 1, len(children), -1, school.name, None, None, None, school.address))
+        for kind, name, ip, mac, sn, model_id in children:
+            creds_number = creds_index.get(creds_by_model.get(model_id), -1)
+            records.append((KINDS.index(kind), parent, 0, 0, creds_number, name, ip, mac, sn, None))
+    for kind, entity in (("wlc", WLC), ("prime", Prime)):
+        for row in session.execute(select(entity.name, entity.ip).order_by(entity.id)):
+            records.append((KINDS.index(kind), -1, 0, 0, -1, row.name, row.ip, None, None, None))
+
+    body = bytearray()
+    indexes = {index: [] for index in INDEXES}
+    for number, (kind, parent, first, count, creds_number, *values) in enumerate(records):
+        body += RECORD.pack(kind, parent, first, count, creds_number, *(part for value in values for part in ref(value)))
+        for index, value in zip(INDEXES, values):
+            if value is not None:
+                indexes[index].append((key_hash(normalize(index, value)), number))
+
+    offset = HEADER.size
+    records_offset = offset
+    offset += len(body)
+    creds_offset = offset
+    offset += len(creds)
+    strings_offset = offset
+    offset += len(strings)
+    index_parts = []
+    index_header = []
+    for index in INDEXES:
+        entries = sorted(indexes[index])
+        data = b"".join(INDEX.pack(*entry) for entry in entries)
+        index_header += [offset, len(entries)]
+        index_parts.append(data)
+        offset += len(data)
+
+    with open(path, "wb") as file:
+        file.write(HEADER.pack(MAGIC, len(records), records_offset, len(creds_rows), creds_offset,
+                               strings_offset, len(strings), *index_header))
+        file.write(body)
+        file.write(creds)
+        file.write(strings)
+        for data in index_parts:
+            file.write(data)
+    logger.info(f"Snapshot {path}: {len(records)} records, {offset} bytes")
+    return len(records)
+
+
+class Snapshot:
+    """
+    Reader of a snapshot file
+        with Snapshot("inventory.snap") as snapshot:
+            switch = snapshot.by_ip("10.1.2.3")[0]
+            school = snapshot.record(switch.parent)
+    """
+    def __init__(self, path):
+        self._file = open(path, "rb")
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        header = HEADER.unpack_from(self._map, 0)
+        if header[0] != MAGIC:
+            self.close()
+            raise ValueError(f"{path} is not an inventory snapshot")
+        (_, self.records, self._records_offset, self.credentials, self._creds_offset,
+         self._strings_offset, _), index_header = header[:7], header[7:]
+        self._indexes = {index: index_header[2 * number:2 * number + 2] for number, index in enumerate(INDEXES)}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+    def _string(self, offset, length):
+        if not length:
+            return None
+        start = self._strings_offset + offset
+        return self._map[start:start + length].decode()
+
+    def record(self, number):
+        """
+        :param number: record index
+        :return: SnapshotRecord
+        """
+        kind, parent, first, count, creds, *refs = RECORD.unpack_from(
+            self._map, self._records_offset + number * RECORD.size
+        )
+        values = [self._string(refs[i], refs[i + 1]) for i in range(0, len(refs), 2)]
+        return SnapshotRecord(number, KINDS[kind], *values, parent, first, count, creds)
+
+    def lookup(self, index, value):
+        """
+        :param index: name, ip, mac or sn
+        :param value: value to look for
+        :return: list of matching SnapshotRecord
+        """
+        key = normalize(index, value)
+        wanted = key_hash(key)
+        offset, count = self._indexes[index]
+        low, high = 0, count
+        while low < high:
+            middle = (low + high) // 2
+            if INDEX.unpack_from(self._map, offset + middle * INDEX.size)[0] < wanted:
+                low = middle + 1
+            else:
+                high = middle
+        found = []
+        while low < count:
+            hashed, number = INDEX.unpack_from(self._map, offset + low * INDEX.size)
+            if hashed != wanted:
+                break
+            record = self.record(number)
+            if normalize(index, getattr(record, index)) == key:
+                found.append(record)
+            low += 1
+        return found
+
+    def by_name(self, name):
+        return self.lookup("name", name)
+
+    def by_ip(self, ip):
+        return self.lookup("ip", ip)
+
+    def by_mac(self, mac):
+        return self.lookup("mac", mac)
+
+    def by_sn(self, sn):
+        return self.lookup("sn", sn)
+
+    def devices(self, school):
+        """
+        :param school: SnapshotRecord of a school
+        :return: list of SnapshotRecord of its devices
+        """
+        return [self.record(number) for number in range(school.first_child, school.first_child + school.children)]
+
+    def creds(self, record):
+        """
+        :return: SnapshotCredentials of a device or None
+        """
+        if record.creds < 0:
+            return None
+        refs = CREDS.unpack_from(self._map, self._creds_offset + record.creds * CREDS.size)
+        return SnapshotCredentials(*(self._string(refs[i], refs[i + 1]) for i in range(0, len(refs), 2)))
+
+    def params(self, record, style="netmiko"):
+        """
+        :return: netmiko or scrapli connection params of a device, None if it has no credentials
+        """
+        creds = self.creds(record)
+        if creds is None:
+            return None
+        if style == "scrapli":
+            return scrapli_params(creds.scrapli_driver, creds.scrapli_transport, record.ip,
+                                  creds.username, creds.password, creds.enable_pass)
+        return netmiko_params(creds.netmiko_device, record.ip, creds.username, creds.password, creds.enable_pass)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline inventory snapshot")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    build_parser = subparsers.add_parser("build")
+    build_parser.add_argument("path")
+    build_parser.add_argument("--include-secrets", action="store_true")
+    get_parser = subparsers.add_parser("get")
+    get_parser.add_argument("path")
+    get_parser.add_argument("value", help="name, ip, mac or serial number")
+    args = parser.parse_args()
+    if args.command == "build":
+        print(build(args.path, include_secrets=args.include_secrets))
+    else:
+        with Snapshot(args.path) as snapshot:
+            for index in INDEXES:
+                try:
+                    records = snapshot.lookup(index, args.value)
+                except ValueError:
+                    continue
+                for record in records:
+                    print(index, record, snapshot.params(record))
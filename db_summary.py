@@ -0,0 +1,111 @@
+import logging
+
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, select, event
+from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.dialects.postgresql import INET, CIDR
+
+from db_orm import get_engine, get_session
+
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+
+"""
+Per-school dashboard rows from the `school_summary` materialized view
+(migrations/0003_school_summary.sql): one indexed scan instead of the
+12 relationships of School per school. The view is as fresh as its last
+refresh(), which runs CONCURRENTLY, readers are not blocked.
+The mapping has its own declarative base, it is never part of db_orm metadata,
+and it is read-only: flushing a SchoolSummary raises.
+
+    refresh()
+    for row in summaries(district="ЦАО"):
+        print(row.name, row.router_ip, row.switches, row.aps)
+"""
+summary_base = declarative_base()
+
+
+class SchoolSummary(summary_base):
+    """
+    `school_summary` materialized view map
+    """
+    __tablename__ = 'school_summary'
+
+    """ `school_summary` view column """
+    id = Column(Integer, primary_key=True)  # school.id
+    name = Column(String(255))  # school.name
+    short_name = Column(String(255))  # school.short_name
+    full_name = Column(String(255))  # school.full_name
+    address = Column(String(255))  # school.address
+    active = Column(Boolean)  # school.active
+    district_id = Column(Integer)  # school.district_id
+    district = Column(String(255))  # district.name
+    project_id = Column(Integer)  # school.project_id
+    project = Column(String(255))  # project.name
+    wlc = Column(String(255))  # wlc.name
+    prime = Column(String(255))  # prime.name
+    router = Column(String(255))  # first router.name
+    router_ip = Column(INET)  # first router.ip
+    kms_net = Column(CIDR)  # first kms_net.network
+    users_net = Column(CIDR)  # first users_net.network
+    rt_net = Column(CIDR)  # first rt_net.network
+    mgts_net = Column(CIDR)  # first mgts_net.network
+    switches = Column(Integer)  # count of switches
+    aps = Column(Integer)  # count of ap
+    updated = Column(DateTime)  # school created or updated
+
+    def __repr__(self):
+        return f"<SchoolSummary(id={self.id}, name={self.name}, switches={self.switches}, aps={self.aps})>"
+
+
+@event.listens_for(SchoolSummary, "before_insert")
+@event.listens_for(SchoolSummary, "before_update")
+@event.listens_for(SchoolSummary, "before_delete")
+def _read_only(mapper, connection, target):
+    raise TypeError("school_summary is a materialized view, change the school tables and refresh()")
+
+
+def refresh(concurrently=True, engine=None):
+    """
+    Recomputes the view
+    :param concurrently: keep the view readable during the refresh
+    :param engine: engine of the database, db_orm engine if None
+    """
+    with (engine or get_engine()).begin() as connection:
+        connection.exec_driver_sql(
+            f'REFRESH MATERIALIZED VIEW {"CONCURRENTLY " if concurrently else ""}"school_summary"'
+        )
+    logger.info("school_summary refreshed")
+
+
+def summaries(district=None, project=None, active=None, session=None):
+    """
+    :param district: District.name or list of names
+    :param project: Project.name or list of names
+    :param active: School.active, all schools if None
+    :param session: SQLAlchemy sesion to database 'sqlalchemy.orm.session.Session', default session if None
+    :return: list of SchoolSummary ordered by school name
+    """
+    session = session or get_session()
+    statement = select(SchoolSummary).order_by(SchoolSummary.name)
+    if district:
+        statement = statement.where(SchoolSummary.district.in_(_names(district)))
+    if project:
+        statement = statement.where(SchoolSummary.project.in_(_names(project)))
+    if active is not None:
+        statement = statement.where(SchoolSummary.active.is_(active))
+    return session.execute(statement).scalars().all()
+
+
+def summary(name, session=None):
+    """
+    :param name: School.name
+    :return: SchoolSummary or None
+    """
+    session = session or get_session()
+    return session.execute(select(SchoolSummary).where(SchoolSummary.name == name)).scalar_one_or_none()
+
+
+def _names(value):
+    return [value] if isinstance(value, str) else list(value)
@@ -0,0 +1,18 @@
+/*
+ * GiST indexes for the inet/cidr containment operators (<<, <<=, >>, >>=, &&)
+ * used by db_inet: prefix and address searches become index scans.
+ */
+
+-- NETWORK TABLES
+CREATE INDEX IF NOT EXISTS "kms_net_network_gist" ON "kms_net" USING gist ("network" inet_ops);
+CREATE INDEX IF NOT EXISTS "users_net_network_gist" ON "users_net" USING gist ("network" inet_ops);
+CREATE INDEX IF NOT EXISTS "rt_net_network_gist" ON "rt_net" USING gist ("network" inet_ops);
+CREATE INDEX IF NOT EXISTS "mgts_net_network_gist" ON "mgts_net" USING gist ("network" inet_ops);
+CREATE INDEX IF NOT EXISTS "sch_net_network_gist" ON "sch_net" USING gist ("network" inet_ops);
+
+-- DEVICE ADDRESSES
+CREATE INDEX IF NOT EXISTS "router_ip_gist" ON "router" USING gist ("ip" inet_ops);
+CREATE INDEX IF NOT EXISTS "switch_ip_gist" ON "switch" USING gist ("ip" inet_ops);
+CREATE INDEX IF NOT EXISTS "ap_ip_gist" ON "ap" USING gist ("ip" inet_ops);
+CREATE INDEX IF NOT EXISTS "wlc_ip_gist" ON "wlc" USING gist ("ip" inet_ops);
+CREATE INDEX IF NOT EXISTS "prime_ip_gist" ON "prime" USING gist ("ip" inet_ops);
@@ -0,0 +1,32 @@
+/*
+ * B-tree indexes on the foreign keys and on the columns searched by exist():
+ * lazy loads of School.switches, School.ap, Model.switch... and the FK checks
+ * of DELETE FROM school become index scans instead of sequential scans.
+ * school_id of the network tables is covered by their (school_id, network) unique constraints.
+ */
+
+-- DEVICES
+CREATE INDEX IF NOT EXISTS "router_school_id_index" ON "router" ("school_id");
+CREATE INDEX IF NOT EXISTS "router_model_id_index" ON "router" ("model_id");
+CREATE INDEX IF NOT EXISTS "switch_school_id_index" ON "switch" ("school_id");
+CREATE INDEX IF NOT EXISTS "switch_model_id_index" ON "switch" ("model_id");
+CREATE INDEX IF NOT EXISTS "ap_school_id_index" ON "ap" ("school_id");
+CREATE INDEX IF NOT EXISTS "ap_model_id_index" ON "ap" ("model_id");
+
+-- SCHOOL
+CREATE INDEX IF NOT EXISTS "school_district_id_index" ON "school" ("district_id");
+CREATE INDEX IF NOT EXISTS "school_wlc_id_index" ON "school" ("wlc_id");
+CREATE INDEX IF NOT EXISTS "school_prime_id_index" ON "school" ("prime_id");
+CREATE INDEX IF NOT EXISTS "school_project_id_index" ON "school" ("project_id");
+
+-- REFERENCE TABLES
+CREATE INDEX IF NOT EXISTS "model_vendor_id_index" ON "model" ("vendor_id");
+CREATE INDEX IF NOT EXISTS "model_credentials_id_index" ON "model" ("credentials_id");
+CREATE INDEX IF NOT EXISTS "prime_stack_master_id_index" ON "prime" ("stack_master_id");
+
+-- LOOKUPS
+CREATE INDEX IF NOT EXISTS "router_sn_index" ON "router" ("sn");
+CREATE INDEX IF NOT EXISTS "router_ip_index" ON "router" ("ip");
+CREATE INDEX IF NOT EXISTS "ap_name_index" ON "ap" ("name");
+CREATE INDEX IF NOT EXISTS "ap_ip_index" ON "ap" ("ip");
+CREATE INDEX IF NOT EXISTS "school_short_name_index" ON "school" ("short_name");
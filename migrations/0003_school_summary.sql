@@ -0,0 +1,47 @@
+/*
+ * One row per school for the dashboard: names of district, project, WLC and Prime,
+ * first router, networks, switch and AP counts.
+ * Refreshed with REFRESH MATERIALIZED VIEW CONCURRENTLY (db_summary.refresh()),
+ * which needs the unique index on "id".
+ */
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS "school_summary" AS
+SELECT
+    "school"."id",
+    "school"."name",
+    "school"."short_name",
+    "school"."full_name",
+    "school"."address",
+    "school"."active",
+    "school"."district_id",
+    "district"."name" AS "district",
+    "school"."project_id",
+    "project"."name" AS "project",
+    "wlc"."name" AS "wlc",
+    "prime"."name" AS "prime",
+    "router"."name" AS "router",
+    "router"."ip" AS "router_ip",
+    (SELECT "network" FROM "kms_net" WHERE "school_id" = "school"."id" ORDER BY "id" LIMIT 1) AS "kms_net",
+    (SELECT "network" FROM "users_net" WHERE "school_id" = "school"."id" ORDER BY "id" LIMIT 1) AS "users_net",
+    (SELECT "network" FROM "rt_net" WHERE "school_id" = "school"."id" ORDER BY "id" LIMIT 1) AS "rt_net",
+    (SELECT "network" FROM "mgts_net" WHERE "school_id" = "school"."id" ORDER BY "id" LIMIT 1) AS "mgts_net",
+    COALESCE("switches"."count", 0) AS "switches",
+    COALESCE("aps"."count", 0) AS "aps",
+    GREATEST("school"."created", "school"."updated") AS "updated"
+FROM "school"
+LEFT JOIN "district" ON "district"."id" = "school"."district_id"
+LEFT JOIN "project" ON "project"."id" = "school"."project_id"
+LEFT JOIN "wlc" ON "wlc"."id" = "school"."wlc_id"
+LEFT JOIN "prime" ON "prime"."id" = "school"."prime_id"
+LEFT JOIN LATERAL (
+    SELECT "name", "ip" FROM "router" WHERE "router"."school_id" = "school"."id" ORDER BY "id" LIMIT 1
+) AS "router" ON TRUE
+LEFT JOIN (SELECT "school_id", COUNT(*) AS "count" FROM "switch" GROUP BY "school_id") AS "switches"
+    ON "switches"."school_id" = "school"."id"
+LEFT JOIN (SELECT "school_id", COUNT(*) AS "count" FROM "ap" GROUP BY "school_id") AS "aps"
+    ON "aps"."school_id" = "school"."id";
+
+CREATE UNIQUE INDEX IF NOT EXISTS "school_summary_id_unique" ON "school_summary" ("id");
+CREATE UNIQUE INDEX IF NOT EXISTS "school_summary_name_unique" ON "school_summary" ("name");
+CREATE INDEX IF NOT EXISTS "school_summary_district_index" ON "school_summary" ("district");
+CREATE INDEX IF NOT EXISTS "school_summary_project_index" ON "school_summary" ("project");
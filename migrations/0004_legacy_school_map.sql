@@ -0,0 +1,11 @@
+/*
+ * Old schema school id -> school.id, written by db_etl.
+ * The incremental sync finds a school by its old id, so a school renamed
+ * in the old database is updated in place instead of created again.
+ */
+
+CREATE TABLE IF NOT EXISTS "legacy_school_map"(
+    "old_id" INTEGER PRIMARY KEY,
+    "school_id" INTEGER NOT NULL REFERENCES "school"("id") ON DELETE CASCADE
+);
+CREATE INDEX IF NOT EXISTS "legacy_school_map_school_id_index" ON "legacy_school_map" ("school_id");
@@ -0,0 +1,13 @@
+/*
+ * GiST indexes of the VLAN subnets of kms_net and users_net,
+ * searched by db_inet together with "network" (0001_inet_gist_indexes.sql).
+ */
+
+-- KMS VLANS
+CREATE INDEX IF NOT EXISTS "kms_net_vlan30_gist" ON "kms_net" USING gist ("vlan30" inet_ops);
+CREATE INDEX IF NOT EXISTS "kms_net_vlan60_gist" ON "kms_net" USING gist ("vlan60" inet_ops);
+CREATE INDEX IF NOT EXISTS "kms_net_vlan70_gist" ON "kms_net" USING gist ("vlan70" inet_ops);
+
+-- USERS VLANS
+CREATE INDEX IF NOT EXISTS "users_net_vlan40_gist" ON "users_net" USING gist ("vlan40" inet_ops);
+CREATE INDEX IF NOT EXISTS "users_net_vlan50_gist" ON "users_net" USING gist ("vlan50" inet_ops);
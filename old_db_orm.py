@@ -14,8 +14,37 @@ do not store the login with the password in textual form in the script or on git
 """
 old_db_url = os.environ.get("OLD_SCHOOL_DATABASE")
 
-old_db_engine = create_engine(old_db_url)
-old_base = declarative_base(old_db_engine)
+old_base = declarative_base()
+_old_db_engine = None
+_old_db_session = None
+
+
+def get_old_engine():
+    """
+    :return: engine to OLD_SCHOOL_DATABASE, created on first call
+    """
+    global _old_db_engine
+    if _old_db_engine is None:
+        _old_db_engine = create_engine(old_db_url)
+    return _old_db_engine
+
+
+def get_old_session():
+    """
+    :return: default session to the old database, created on first call
+    """
+    global _old_db_session
+    if _old_db_session is None:
+        _old_db_session = Session(bind=get_old_engine())
+    return _old_db_session
+
+
+def __getattr__(name):
+    if name == "old_db_engine":
+        return get_old_engine()
+    if name == "old_db_session":
+        return get_old_session()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 class OldSchool(old_base):
@@ -160,7 +189,5 @@ class OldPrime(old_base):
         return '<OldPrime: {}, ip: {}>'.format(self.name, self.ip)
 
 
-old_db_session = Session(bind=old_db_engine)
-
 if __name__ == "__main__":
     pass